@@ -0,0 +1,198 @@
+"""Sales analytics backed by precomputed aggregates
+
+Background jobs queued by checkout and cancellation (see app.tasks) keep
+three small tables up to date:
+
+* ``daily_book_sales`` - units, revenue and orders per book per day;
+* ``daily_category_sales`` - units and revenue per category per day;
+* ``order_status_counts`` - number of orders in each status.
+
+Cancelled orders do not count as sales. Reports read only these tables, so
+their cost depends on the number of days and books asked for, never on the
+number of orders. ``rebuild_aggregates`` recomputes everything from the
+orders table, e.g. after bulk-loading orders or adding analytics to an
+existing database (``flask rebuild-analytics``). It retires pending
+analytics jobs in the same transaction, since the rebuild already counts
+their orders.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, update, delete, func, text
+from sqlalchemy.dialects import sqlite, postgresql
+from app.models import db, Book, Category, Order, OrderItem, DailyBookSales, DailyCategorySales, OrderStatusCount, Job
+
+_UPSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+def _add(model, keys, rows):
+    """Add the counters in rows onto the aggregate rows with the same keys"""
+    if not rows:
+        return
+    table = model.__table__
+    counters = [name for name in rows[0] if name not in keys]
+    upsert = _UPSERTS.get(db.engine.dialect.name)
+    if upsert is not None:
+        statement = upsert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=keys,
+            set_={name: table.c[name] + statement.excluded[name] for name in counters}
+        )
+        db.session.execute(statement, rows)
+        return
+    for row in rows:
+        result = db.session.execute(
+            update(table)
+            .where(*[table.c[key] == row[key] for key in keys])
+            .values({name: table.c[name] + row[name] for name in counters})
+        )
+        if result.rowcount == 0:
+            db.session.execute(insert(table).values(row))
+
+def _add_sales(order, sign):
+    """Add (sign=1) or remove (sign=-1) an order's lines from the daily sales"""
+    category_ids = dict(db.session.execute(
+        select(Book.id, Book.category_id).where(Book.id.in_([item.book_id for item in order.items]))
+    ).all())
+    day = order.created_at.date()
+    books = []
+    categories = {}
+    for item in order.items:
+        books.append({'day': day, 'book_id': item.book_id, 'units': sign * item.quantity,
+                      'revenue': sign * item.subtotal, 'orders': sign})
+        category = categories.setdefault(category_ids[item.book_id], {
+            'day': day, 'category_id': category_ids[item.book_id], 'units': 0, 'revenue': 0.0
+        })
+        category['units'] += sign * item.quantity
+        category['revenue'] += sign * item.subtotal
+    _add(DailyBookSales, ['day', 'book_id'], books)
+    _add(DailyCategorySales, ['day', 'category_id'], list(categories.values()))
+
+def _add_statuses(changes):
+    _add(OrderStatusCount, ['status'],
+         [{'status': status, 'count': count} for status, count in changes.items()])
+
+def record_order(order, status=None):
+    """Count a newly placed order
+
+    ``status`` is the order's status when it was placed, in case it has
+    changed since; it defaults to the current one.
+    """
+    status = status or order.status
+    if status != 'cancelled':
+        _add_sales(order, 1)
+    _add_statuses({status: 1})
+
+def record_status_change(order, old_status, new_status):
+    """Move an order between statuses"""
+    if (old_status == 'cancelled') != (new_status == 'cancelled'):
+        _add_sales(order, -1 if new_status == 'cancelled' else 1)
+    _add_statuses({old_status: -1, new_status: 1})
+
+def rebuild_aggregates():
+    """Recompute every aggregate table from the orders; the caller commits"""
+    if db.engine.dialect.name == 'postgresql':
+        # Hold off new orders and jobs until the rebuild commits (SQLite
+        # already serialises writers from the first write below)
+        db.session.execute(text('LOCK TABLE orders, jobs IN SHARE ROW EXCLUSIVE MODE'))
+    # Queued or running analytics jobs cover orders counted below; marking
+    # them done also makes a running one's own commit fail (see run_job)
+    db.session.execute(
+        update(Job)
+        .where(Job.name.like('analytics.%'), Job.status.in_(['queued', 'running']))
+        .values(status='done', finished_at=datetime.utcnow(), last_error='Superseded by rebuild_aggregates')
+        .execution_options(synchronize_session=False)
+    )
+    for model in (DailyBookSales, DailyCategorySales, OrderStatusCount):
+        db.session.execute(delete(model))
+
+    day = func.date(Order.created_at)
+    revenue = func.sum(OrderItem.quantity * OrderItem.unit_price)
+    db.session.execute(insert(DailyBookSales).from_select(
+        ['day', 'book_id', 'units', 'revenue', 'orders'],
+        select(day, OrderItem.book_id, func.sum(OrderItem.quantity), revenue, func.count(func.distinct(Order.id)))
+        .join(OrderItem, OrderItem.order_id == Order.id)
+        .where(Order.status != 'cancelled')
+        .group_by(day, OrderItem.book_id)
+    ))
+    db.session.execute(insert(DailyCategorySales).from_select(
+        ['day', 'category_id', 'units', 'revenue'],
+        select(day, Book.category_id, func.sum(OrderItem.quantity), revenue)
+        .join(OrderItem, OrderItem.order_id == Order.id)
+        .join(Book, Book.id == OrderItem.book_id)
+        .where(Order.status != 'cancelled')
+        .group_by(day, Book.category_id)
+    ))
+    db.session.execute(insert(OrderStatusCount).from_select(
+        ['status', 'count'],
+        select(Order.status, func.count(Order.id)).group_by(Order.status)
+    ))
+    return {model.__tablename__: db.session.query(model).count()
+            for model in (DailyBookSales, DailyCategorySales, OrderStatusCount)}
+
+def _since(days):
+    return datetime.utcnow().date() - timedelta(days=days - 1)
+
+def top_books(days=30, limit=10):
+    """Best-selling books over the last days, by units"""
+    # Rank on the aggregate alone and look up titles for the winners only
+    units = func.sum(DailyBookSales.units).label('units')
+    ranked = (
+        select(DailyBookSales.book_id, units,
+               func.sum(DailyBookSales.revenue).label('revenue'),
+               func.sum(DailyBookSales.orders).label('orders'))
+        .where(DailyBookSales.day >= _since(days))
+        .group_by(DailyBookSales.book_id)
+        .having(units > 0)
+        .order_by(units.desc(), DailyBookSales.book_id)
+        .limit(limit)
+        .subquery()
+    )
+    rows = db.session.execute(
+        select(ranked, Book.title, Book.author)
+        .outerjoin(Book, Book.id == ranked.c.book_id)
+        .order_by(ranked.c.units.desc(), ranked.c.book_id)
+    )
+    return [dict(row._mapping, revenue=round(row.revenue, 2)) for row in rows]
+
+def top_categories(days=30, limit=10):
+    """Best-selling categories over the last days, by revenue"""
+    revenue = func.sum(DailyCategorySales.revenue).label('revenue')
+    ranked = (
+        select(DailyCategorySales.category_id,
+               func.sum(DailyCategorySales.units).label('units'), revenue)
+        .where(DailyCategorySales.day >= _since(days))
+        .group_by(DailyCategorySales.category_id)
+        .having(revenue > 0)
+        .order_by(revenue.desc(), DailyCategorySales.category_id)
+        .limit(limit)
+        .subquery()
+    )
+    rows = db.session.execute(
+        select(ranked, Category.name)
+        .outerjoin(Category, Category.id == ranked.c.category_id)
+        .order_by(ranked.c.revenue.desc(), ranked.c.category_id)
+    )
+    return [dict(row._mapping, revenue=round(row.revenue, 2)) for row in rows]
+
+def daily_sales(days=30, category_id=None):
+    """Units and revenue for each of the last days, oldest first, zero-filled"""
+    query = (
+        select(DailyCategorySales.day, func.sum(DailyCategorySales.units),
+               func.sum(DailyCategorySales.revenue))
+        .where(DailyCategorySales.day >= _since(days))
+        .group_by(DailyCategorySales.day)
+    )
+    if category_id is not None:
+        query = query.where(DailyCategorySales.category_id == category_id)
+    totals = {day: (units, revenue) for day, units, revenue in db.session.execute(query)}
+    start = _since(days)
+    series = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        units, revenue = totals.get(day, (0, 0.0))
+        series.append({'day': day.isoformat(), 'units': units, 'revenue': round(revenue, 2)})
+    return series
+
+def status_counts():
+    """{status: number of orders}"""
+    return dict(db.session.execute(
+        select(OrderStatusCount.status, OrderStatusCount.count).order_by(OrderStatusCount.status)
+    ).all())
@@ -0,0 +1,250 @@
+"""Bulk catalog import and export
+
+Imports read CSV or JSON Lines one chunk at a time, so memory is bounded by
+``chunk_size`` whatever the size of the feed. Each chunk is validated,
+matched against existing books (by ``id`` when the row has one, otherwise by
+title and author) and written with one executemany INSERT and one
+executemany UPDATE. Category names are resolved through a name -> id map
+loaded once; unknown categories are created on the fly.
+
+An import is all or nothing: every chunk is written in one transaction,
+committed after the last row, so a malformed line anywhere leaves the
+catalog as it was. The search triggers stay in place and index the rows in
+that same transaction. ``stock`` only sets the stock of new books; existing
+books' stock moves by ``stock_delta``, so sales made since the feed was
+produced are kept. The admin page queues imports as ``catalog.import`` jobs.
+
+Exports stream rows straight from a server-side cursor into CSV or JSON
+Lines, so neither the database result nor the output is held in memory.
+"""
+import csv
+import io
+import json
+from collections import namedtuple
+from sqlalchemy import select, insert, update, bindparam, tuple_, case
+from app.models import db, Book, Category, Order, OrderItem
+from app.catalog import invalidate_books, invalidate_catalog
+
+FORMATS = ('csv', 'jsonl')
+
+BOOK_COLUMNS = ('id', 'title', 'author', 'price', 'stock', 'description', 'category')
+ORDER_COLUMNS = ('order_id', 'user_id', 'status', 'created_at', 'book_id', 'quantity', 'unit_price')
+
+# Error messages kept in the report; the count covers all of them
+MAX_REPORTED_ERRORS = 100
+
+ImportReport = namedtuple('ImportReport', ['rows', 'inserted', 'updated', 'categories', 'invalid', 'errors'])
+
+class ImportFormatError(Exception):
+    """Raised when the input cannot be parsed at all"""
+
+def format_for(filename, default='csv'):
+    """Guess the format from a file name"""
+    name = (filename or '').lower()
+    if name.endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    if name.endswith('.csv'):
+        return 'csv'
+    return default
+
+def read_rows(stream, fmt):
+    """Yield (line number, row dict) from a text stream"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        if not reader.fieldnames or not {'title', 'author'} <= set(reader.fieldnames):
+            raise ImportFormatError('CSV header must include at least title and author')
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                raise ImportFormatError(f'line {line_number}: invalid JSON')
+            if not isinstance(row, dict):
+                raise ImportFormatError(f'line {line_number}: expected an object')
+            yield line_number, row
+    else:
+        raise ImportFormatError(f'Unknown format {fmt!r}')
+
+def _clean(row):
+    """Validate one input row, returning (values, error message)"""
+    def text(name):
+        value = row.get(name)
+        return str(value).strip() if value is not None else ''
+
+    values = {'title': text('title'), 'author': text('author'),
+              'description': text('description') or None, 'category': text('category')}
+    if not values['title'] or not values['author'] or not values['category']:
+        return None, 'title, author and category are required'
+    if len(values['title']) > 200 or len(values['author']) > 100 or len(values['category']) > 50:
+        return None, 'title, author or category is too long'
+    try:
+        values['id'] = int(row['id']) if text('id') else None
+        values['price'] = round(float(row.get('price')), 2)
+        values['stock'] = int(row['stock']) if text('stock') else 0
+        values['stock_delta'] = int(row['stock_delta']) if text('stock_delta') else 0
+    except (TypeError, ValueError):
+        return None, 'id, price, stock and stock_delta must be numbers'
+    if values['price'] < 0 or values['stock'] < 0:
+        return None, 'price and stock must not be negative'
+    return values, None
+
+_books = Book.__table__
+
+# Executed with executemany; the remaining keys of each row become the SET
+# clause. Stock moves by the delta, never below zero, and bumping the version
+# makes open admin edit forms detect the import.
+_new_stock = _books.c.stock + bindparam('b_stock_delta')
+_update_book = (
+    update(_books)
+    .where(_books.c.id == bindparam('b_id'))
+    .values(stock=case((_new_stock < 0, 0), else_=_new_stock), version=_books.c.version + 1)
+)
+
+def _existing_ids(chunk):
+    """Map each chunk row to the id of the book it updates, if any"""
+    ids = {row['id'] for row in chunk if row['id'] is not None}
+    pairs = {(row['title'], row['author']) for row in chunk if row['id'] is None}
+    known_ids = set()
+    by_pair = {}
+    if ids:
+        known_ids = set(db.session.scalars(select(Book.id).where(Book.id.in_(ids))))
+    if pairs:
+        for book_id, title, author in db.session.execute(
+            select(Book.id, Book.title, Book.author).where(tuple_(Book.title, Book.author).in_(pairs))
+        ):
+            by_pair.setdefault((title, author), book_id)
+    return known_ids, by_pair
+
+def import_books(rows, chunk_size=1000, dry_run=False, progress=None):
+    """Insert or update books from (line number, row dict) pairs, all or nothing
+
+    Nothing is committed until the last row has been written; any exception
+    rolls the whole import back. With ``dry_run`` everything is validated
+    and matched but nothing is written. ``progress(rows_read)`` is called
+    after every chunk.
+    """
+    categories = {name: category_id for category_id, name in db.session.execute(
+        select(Category.id, Category.name))}
+    new_categories = 0
+    counts = {'rows': 0, 'inserted': 0, 'updated': 0, 'invalid': 0}
+    errors = []
+    updated_ids = []
+
+    def category_id(name):
+        nonlocal new_categories
+        if name not in categories:
+            new_categories += 1
+            if dry_run:
+                categories[name] = -new_categories
+            else:
+                categories[name] = db.session.execute(
+                    insert(Category.__table__).values(name=name)).inserted_primary_key[0]
+        return categories[name]
+
+    def flush(chunk):
+        known_ids, by_pair = _existing_ids(chunk)
+        inserts, updates = {}, {}
+        for row in chunk:
+            row['category_id'] = category_id(row.pop('category'))
+            book_id = row['id'] if row['id'] in known_ids else by_pair.get((row['title'], row['author']))
+            stock, stock_delta = row.pop('stock'), row.pop('stock_delta')
+            if book_id is not None:
+                # A later duplicate in the same chunk wins, but deltas add up
+                if book_id in updates:
+                    stock_delta += updates[book_id]['stock_delta']
+                updates[book_id] = dict(row, id=book_id, stock_delta=stock_delta)
+            else:
+                inserts[row['id'] or (row['title'], row['author'])] = dict(row, stock=stock)
+        counts['inserted'] += len(inserts)
+        counts['updated'] += len(updates)
+        if dry_run:
+            return
+        # executemany needs the same keys in every row, so explicit ids go separately
+        with_id = [row for row in inserts.values() if row['id'] is not None]
+        without_id = [{key: value for key, value in row.items() if key != 'id'}
+                      for row in inserts.values() if row['id'] is None]
+        for batch in (with_id, without_id):
+            if batch:
+                db.session.execute(insert(_books), batch)
+        if updates:
+            db.session.execute(_update_book, [
+                {f'b_{key}' if key in ('id', 'stock_delta') else key: value for key, value in row.items()}
+                for row in updates.values()
+            ])
+        updated_ids.extend(updates)
+
+    try:
+        chunk = []
+        for line_number, raw in rows:
+            counts['rows'] += 1
+            values, error = _clean(raw)
+            if error:
+                counts['invalid'] += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append(f'line {line_number}: {error}')
+                continue
+            chunk.append(values)
+            if len(chunk) >= chunk_size:
+                flush(chunk)
+                chunk = []
+                if progress:
+                    progress(counts['rows'])
+        if chunk:
+            flush(chunk)
+        if progress:
+            progress(counts['rows'])
+    except BaseException:
+        db.session.rollback()
+        raise
+    if dry_run:
+        db.session.rollback()
+    else:
+        db.session.commit()
+        invalidate_books(updated_ids)
+        invalidate_catalog()
+    return ImportReport(counts['rows'], counts['inserted'], counts['updated'],
+                        new_categories, counts['invalid'], errors)
+
+def _serialise(rows, columns, fmt):
+    """Yield CSV or JSON Lines text for an iterable of tuples"""
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(row)
+            if buffer.tell() > 65536:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    else:
+        for row in rows:
+            yield json.dumps(dict(zip(columns, row)), default=str) + '\n'
+
+def _stream(statement, batch_size):
+    # yield_per streams from a server-side cursor where the driver supports one
+    return db.session.execute(statement.execution_options(yield_per=batch_size))
+
+def export_books(fmt='csv', batch_size=1000):
+    """Yield the whole catalog as CSV or JSON Lines text"""
+    statement = (
+        select(Book.id, Book.title, Book.author, Book.price, Book.stock, Book.description, Category.name)
+        .join(Category, Book.category_id == Category.id)
+        .order_by(Book.id)
+    )
+    return _serialise(_stream(statement, batch_size), BOOK_COLUMNS, fmt)
+
+def export_orders(fmt='csv', batch_size=1000):
+    """Yield every order line as CSV or JSON Lines text"""
+    statement = (
+        select(Order.id, Order.user_id, Order.status, Order.created_at,
+               OrderItem.book_id, OrderItem.quantity, OrderItem.unit_price)
+        .join(OrderItem, OrderItem.order_id == Order.id)
+        .order_by(Order.id, OrderItem.id)
+    )
+    return _serialise(_stream(statement, batch_size), ORDER_COLUMNS, fmt)
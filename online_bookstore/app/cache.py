@@ -0,0 +1,284 @@
+"""Pluggable application cache
+
+``cache`` is initialised from the app config like ``db``. The backend is
+chosen with ``CACHE_BACKEND``:
+
+* ``'sqlite'`` (the default) - a SQLite file shared by every process on the
+  host, so an invalidation made by one web worker, the job worker or a CLI
+  command is seen by all of them on their next read;
+* ``'memory'`` - in-process LRU with TTL, fastest, but invalidations only
+  reach the process that made them, so use it with a single process only;
+* ``'null'`` - caching disabled;
+* an import path such as ``'myapp.redis_cache:RedisCache'`` for any class
+  implementing ``CacheBackend``, e.g. to share one cache between hosts.
+
+Values must be picklable so that shared backends can store them; query
+results are cached as plain dicts and fragments as strings.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from werkzeug.utils import import_string
+
+class CacheBackend:
+    """Interface a cache store has to implement"""
+
+    def get(self, key):
+        """Return the cached value or None"""
+        raise NotImplementedError
+
+    def get_many(self, keys):
+        """Return a {key: value} dict for the keys that are cached"""
+        values = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                values[key] = value
+        return values
+
+    def set(self, key, value, ttl=None):
+        """Store a value, expiring after ttl seconds if given"""
+        raise NotImplementedError
+
+    def set_many(self, mapping, ttl=None):
+        """Store several values at once"""
+        for key, value in mapping.items():
+            self.set(key, value, ttl)
+
+    def delete(self, key):
+        """Remove a key if present"""
+        raise NotImplementedError
+
+    def delete_many(self, keys):
+        """Remove several keys"""
+        for key in keys:
+            self.delete(key)
+
+    def incr(self, key):
+        """Atomically increment an integer counter, starting from 0, and return it"""
+        raise NotImplementedError
+
+    def clear(self):
+        """Remove every key"""
+        raise NotImplementedError
+
+class NullCache(CacheBackend):
+    """Backend that stores nothing"""
+
+    def __init__(self, **options):
+        pass
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def incr(self, key):
+        return 0
+
+    def clear(self):
+        pass
+
+class MemoryCache(CacheBackend):
+    """Thread-safe in-process LRU cache with per-key TTL"""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            value, expires = self._data.get(key, (0, None))
+            self._data[key] = (value + 1, expires)
+            self._data.move_to_end(key)
+            return value + 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+class SQLiteCache(CacheBackend):
+    """Cache in a SQLite file, shared by every process that opens it
+
+    Each thread keeps its own connection. Expired and surplus entries are
+    pruned every ``prune_interval`` writes, soonest-expiring first.
+    """
+
+    def __init__(self, path, max_entries=10000, prune_interval=1000, timeout=5):
+        self.path = path
+        self.max_entries = max_entries
+        self.prune_interval = prune_interval
+        self.timeout = timeout
+        self._local = threading.local()
+        self._writes = 0
+        self._connection().execute(
+            'CREATE TABLE IF NOT EXISTS cache '
+            '(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL) WITHOUT ROWID'
+        )
+
+    def _connection(self):
+        # Connections must not cross a fork, so they are per process too
+        if getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout,
+                                         isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return self._local.connection
+
+    @staticmethod
+    def _dump(value):
+        # Counters stay plain integers so incr can add to them in SQL
+        if type(value) is int:
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _load(value):
+        return value if isinstance(value, int) else pickle.loads(value)
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys):
+        keys = list(dict.fromkeys(keys))
+        values = {}
+        now = time.time()
+        # Stay well under SQLite's limit on bound parameters
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            rows = self._connection().execute(
+                f'SELECT key, value, expires FROM cache WHERE key IN ({",".join("?" * len(batch))})', batch
+            )
+            values.update((key, self._load(value)) for key, value, expires in rows
+                          if expires is None or expires >= now)
+        return values
+
+    def set(self, key, value, ttl=None):
+        self.set_many({key: value}, ttl)
+
+    def set_many(self, mapping, ttl=None):
+        expires = time.time() + ttl if ttl else None
+        connection = self._connection()
+        connection.executemany(
+            'INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+            [(key, self._dump(value), expires) for key, value in mapping.items()]
+        )
+        self._writes += len(mapping)
+        if self._writes >= self.prune_interval:
+            self._writes = 0
+            self._prune(connection)
+
+    def _prune(self, connection):
+        connection.execute('DELETE FROM cache WHERE expires < ?', (time.time(),))
+        connection.execute(
+            'DELETE FROM cache WHERE key IN (SELECT key FROM cache WHERE expires IS NOT NULL '
+            'ORDER BY expires LIMIT max(0, (SELECT count(*) FROM cache) - ?))', (self.max_entries,)
+        )
+
+    def delete(self, key):
+        self.delete_many([key])
+
+    def delete_many(self, keys):
+        self._connection().executemany('DELETE FROM cache WHERE key = ?', [(key,) for key in keys])
+
+    def incr(self, key):
+        return self._connection().execute(
+            'INSERT INTO cache (key, value, expires) VALUES (?, 1, NULL) '
+            'ON CONFLICT (key) DO UPDATE SET value = value + 1 RETURNING value', (key,)
+        ).fetchone()[0]
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+BACKENDS = {
+    'sqlite': SQLiteCache,
+    'memory': MemoryCache,
+    'null': NullCache,
+}
+
+class Cache:
+    """Cache facade bound to the configured backend"""
+
+    def __init__(self):
+        self.backend = NullCache()
+        self.default_ttl = None
+
+    def init_app(self, app):
+        """Create the backend from app config"""
+        name = app.config.get('CACHE_BACKEND', 'memory')
+        backend_class = BACKENDS.get(name) or import_string(name)
+        options = dict(app.config.get('CACHE_OPTIONS', {}))
+        if backend_class is SQLiteCache:
+            options.setdefault('path', os.path.join(app.instance_path, 'cache.sqlite'))
+            os.makedirs(os.path.dirname(options['path']), exist_ok=True)
+        self.backend = backend_class(**options)
+        self.default_ttl = app.config.get('CACHE_DEFAULT_TTL')
+        app.extensions['cache'] = self
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def get_many(self, keys):
+        return self.backend.get_many(keys)
+
+    def set(self, key, value, ttl=None):
+        self.backend.set(key, value, ttl or self.default_ttl)
+
+    def set_many(self, mapping, ttl=None):
+        self.backend.set_many(mapping, ttl or self.default_ttl)
+
+    def delete(self, key):
+        self.backend.delete(key)
+
+    def delete_many(self, keys):
+        self.backend.delete_many(keys)
+
+    def incr(self, key):
+        return self.backend.incr(key)
+
+    def clear(self):
+        self.backend.clear()
+
+    def get_or_set(self, key, create, ttl=None):
+        """Return the cached value for key, calling create() to fill it on a miss"""
+        value = self.get(key)
+        if value is None:
+            value = create()
+            if value is not None:
+                self.set(key, value, ttl)
+        return value
+
+cache = Cache()
@@ -0,0 +1,113 @@
+"""Cached read access to the public catalog
+
+Each book is cached once under ``book:<id>`` as a plain dict (templates read
+dicts with the same ``book.title`` syntax as models). Listing pages cache
+only the ids they contain, under a key that includes a catalog generation
+number, and resolve the books through the per-book entries. That way:
+
+* a stock change or edit invalidates just ``book:<id>``;
+* adding, removing or re-categorising a book bumps the generation, which
+  orphans every cached listing at once without enumerating keys.
+
+Each book also has a random version token under ``book-version:<id>`` that
+is replaced on invalidation; rendered fragments include it in their keys.
+"""
+import os
+from sqlalchemy.orm import joinedload
+from app.cache import cache
+from app.models import Book, Category
+from app.pagination import keyset_paginate
+
+GENERATION_KEY = 'catalog:generation'
+
+def book_to_dict(book):
+    """Snapshot the fields the catalog templates use"""
+    return {
+        'id': book.id,
+        'title': book.title,
+        'author': book.author,
+        'price': book.price,
+        'stock': book.stock,
+        'description': book.description,
+        'category_id': book.category_id,
+        'category': {'id': book.category.id, 'name': book.category.name},
+    }
+
+def _book_key(book_id):
+    return f'book:{book_id}'
+
+def _generation():
+    return cache.get(GENERATION_KEY) or 0
+
+def get_books(ids):
+    """Return cached book dicts for ids in order, loading misses in one query"""
+    cached = cache.get_many([_book_key(book_id) for book_id in ids])
+    missing = [book_id for book_id in ids if _book_key(book_id) not in cached]
+    if missing:
+        books = Book.query.options(joinedload(Book.category)).filter(Book.id.in_(missing)).all()
+        loaded = {_book_key(book.id): book_to_dict(book) for book in books}
+        cache.set_many(loaded)
+        cached.update(loaded)
+    return [cached[_book_key(book_id)] for book_id in ids if _book_key(book_id) in cached]
+
+def get_book(book_id):
+    """Return one cached book dict, or None if it does not exist"""
+    books = get_books([book_id])
+    return books[0] if books else None
+
+def featured_books(limit=9):
+    """Books shown on the home page"""
+    key = f'catalog:{_generation()}:featured:{limit}'
+    ids = cache.get_or_set(key, lambda: [
+        book_id for (book_id,) in Book.query.with_entities(Book.id).order_by(Book.id).limit(limit)
+    ])
+    return get_books(ids)
+
+def book_page(category_id=None, after=None, before=None, per_page=12):
+    """One keyset page of the catalog, optionally within a category"""
+    key = f'catalog:{_generation()}:page:{category_id}:{after}:{before}:{per_page}'
+
+    def load():
+        query = Book.query.options(joinedload(Book.category))
+        if category_id:
+            query = query.filter_by(category_id=category_id)
+        page = keyset_paginate(query, Book.id, after=after, before=before, per_page=per_page)
+        cache.set_many({_book_key(book.id): book_to_dict(book) for book in page.items})
+        return page._replace(items=[book.id for book in page.items])
+
+    page = cache.get_or_set(key, load)
+    return page._replace(items=get_books(page.items))
+
+def all_categories():
+    """All categories as dicts"""
+    return cache.get_or_set('catalog:categories', lambda: [
+        {'id': category.id, 'name': category.name}
+        for category in Category.query.order_by(Category.id).all()
+    ])
+
+def _version_key(book_id):
+    return f'book-version:{book_id}'
+
+# Versions outlive the fragments keyed on them; a lost version gets a new token
+VERSION_TTL = 86400
+
+def book_versions(ids):
+    """{book id: version token} for the given book ids"""
+    versions = {int(key.rsplit(':', 1)[1]): value
+                for key, value in cache.get_many([_version_key(book_id) for book_id in ids]).items()}
+    missing = {_version_key(book_id): os.urandom(6).hex() for book_id in ids if book_id not in versions}
+    if missing:
+        cache.set_many(missing, VERSION_TTL)
+        versions.update({int(key.rsplit(':', 1)[1]): value for key, value in missing.items()})
+    return versions
+
+def invalidate_books(book_ids):
+    """Drop cached copies of books whose fields (e.g. stock) changed"""
+    cache.delete_many([_book_key(book_id) for book_id in book_ids])
+    cache.set_many({_version_key(book_id): os.urandom(6).hex() for book_id in book_ids}, VERSION_TTL)
+
+def invalidate_catalog(book_id=None):
+    """Invalidate every cached listing, plus one book if given"""
+    cache.incr(GENERATION_KEY)
+    if book_id is not None:
+        invalidate_books([book_id])
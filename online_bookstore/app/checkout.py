@@ -0,0 +1,47 @@
+"""Checkout: turn a set of books and quantities into one order"""
+from app.models import db, Book, Order, OrderItem
+from app.inventory import reserve_many
+from app.catalog import invalidate_books
+from app.jobs import enqueue
+
+class CheckoutError(Exception):
+    """Raised when an order cannot be placed; the message is shown to the user"""
+
+def place_order(user_id, quantities):
+    """Create a pending order for a {book_id: quantity} map in a single transaction
+
+    All lines are validated and reserved together, so either every book is
+    reserved and the order is committed or nothing is written.
+    """
+    quantities = {book_id: quantity for book_id, quantity in quantities.items() if quantity}
+    if not quantities:
+        raise CheckoutError('Your cart is empty')
+    if any(quantity < 1 for quantity in quantities.values()):
+        raise CheckoutError('Please enter a valid quantity')
+    
+    books = {book.id: book for book in Book.query.filter(Book.id.in_(quantities)).all()}
+    if len(books) != len(quantities):
+        raise CheckoutError('Some books in your cart are no longer available')
+    
+    if not reserve_many(quantities):
+        db.session.rollback()
+        short = [book.title for book in Book.query.filter(Book.id.in_(quantities)).all()
+                 if book.stock < quantities[book.id]]
+        raise CheckoutError('Insufficient stock available for: ' + ', '.join(short or ['some books']))
+    
+    items = [OrderItem(book_id=book_id, quantity=quantity, unit_price=books[book_id].price)
+             for book_id, quantity in quantities.items()]
+    order = Order(
+        user_id=user_id,
+        items=items,
+        total_price=sum(item.subtotal for item in items),
+        status='pending'
+    )
+    db.session.add(order)
+    db.session.flush()
+    # Side effects run in the background once the order is committed
+    enqueue('analytics.order_placed', {'order_id': order.id, 'status': order.status}, key=f'order-placed-analytics:{order.id}')
+    enqueue('mail.order_confirmation', {'order_id': order.id}, key=f'order-placed-mail:{order.id}')
+    db.session.commit()
+    invalidate_books(quantities)
+    return order
@@ -0,0 +1,137 @@
+"""Flask CLI commands for database setup and bulk data
+
+    flask --app run init-db
+    flask --app run seed --size 100000
+    flask --app run import-books feed.csv --dry-run
+    flask --app run export books --output books.jsonl
+    flask --app run rebuild-analytics
+    flask --app run rebuild-recommendations
+    flask --app run worker --threads 4
+"""
+import time
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from app.database import init_db
+from app.seed import seed_sample_data, generate_catalog
+from app.models import db
+from app.analytics import rebuild_aggregates
+from app.recommendations import rebuild_recommendations
+from app.jobs import Worker, queue_stats
+from app.bulk import FORMATS, ImportFormatError, format_for, read_rows, import_books, export_books, export_orders
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create or upgrade the database schema and search index."""
+    started = time.perf_counter()
+    init_db()
+    click.echo(f'Database ready ({time.perf_counter() - started:.2f}s)')
+
+@click.command('seed')
+@click.option('--size', type=int, default=0, help='Synthetic books to add on top of the sample data.')
+@click.option('--users', type=int, default=None, help='Synthetic users (default: size / 10).')
+@click.option('--orders', type=int, default=None, help='Synthetic orders (default: size).')
+@click.option('--chunk-size', type=int, default=10000, help='Rows per bulk insert.')
+@click.option('--seed', 'random_seed', type=int, default=42, help='Random seed for synthetic data.')
+@with_appcontext
+def seed_command(size, users, orders, chunk_size, random_seed):
+    """Insert the sample catalog and optionally a synthetic dataset."""
+    started = time.perf_counter()
+    init_db()
+    if seed_sample_data():
+        click.echo('Inserted sample users, categories and books')
+
+    if size:
+        def progress(label, rows):
+            click.echo(f'  {label}: {rows:,} rows ({time.perf_counter() - started:.1f}s)')
+
+        written = generate_catalog(
+            books=size,
+            users=size // 10 if users is None else users,
+            orders=size if orders is None else orders,
+            seed=random_seed, chunk_size=chunk_size, progress=progress
+        )
+        click.echo('Generated ' + ', '.join(f'{count:,} {table}' for table, count in written.items()))
+        if written['orders']:
+            rebuild_aggregates()
+            db.session.commit()
+            click.echo(f'  analytics rebuilt ({time.perf_counter() - started:.1f}s)')
+    click.echo(f'Done in {time.perf_counter() - started:.1f}s')
+
+@click.command('import-books')
+@click.argument('source', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), default=None,
+              help='Input format (default: from the file extension).')
+@click.option('--chunk-size', type=int, default=1000, help='Rows per batch.')
+@click.option('--dry-run', is_flag=True, help='Validate and match rows without writing.')
+@with_appcontext
+def import_books_command(source, fmt, chunk_size, dry_run):
+    """Insert or update books from a CSV or JSON Lines file ('-' for stdin)."""
+    started = time.perf_counter()
+
+    def progress(rows):
+        click.echo(f'  {rows:,} rows read ({time.perf_counter() - started:.1f}s)', err=True)
+
+    try:
+        report = import_books(read_rows(source, fmt or format_for(source.name)),
+                              chunk_size=chunk_size, dry_run=dry_run, progress=progress)
+    except ImportFormatError as e:
+        raise click.ClickException(str(e))
+    for error in report.errors:
+        click.echo(f'  {error}', err=True)
+    click.echo(f'{"Would import" if dry_run else "Imported"} {report.rows:,} rows: '
+               f'{report.inserted:,} new, {report.updated:,} updated, '
+               f'{report.categories:,} new categories, {report.invalid:,} invalid '
+               f'({time.perf_counter() - started:.1f}s)')
+
+@click.command('export')
+@click.argument('table', type=click.Choice(['books', 'orders']))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), default=None,
+              help='Output format (default: from the file extension, else csv).')
+@click.option('--output', type=click.File('w', encoding='utf-8'), default='-', help='Output file.')
+@with_appcontext
+def export_command(table, fmt, output):
+    """Stream books or order lines as CSV or JSON Lines."""
+    export = export_books if table == 'books' else export_orders
+    for text in export(fmt or format_for(output.name)):
+        output.write(text)
+
+@click.command('rebuild-analytics')
+@with_appcontext
+def rebuild_analytics_command():
+    """Recompute the sales aggregates from the orders table."""
+    started = time.perf_counter()
+    written = rebuild_aggregates()
+    db.session.commit()
+    click.echo('Rebuilt ' + ', '.join(f'{count:,} {table}' for table, count in written.items())
+               + f' ({time.perf_counter() - started:.1f}s)')
+
+@click.command('rebuild-recommendations')
+@with_appcontext
+def rebuild_recommendations_command():
+    """Recompute the co-purchase recommendations from the orders table."""
+    started = time.perf_counter()
+    books = rebuild_recommendations()
+    db.session.commit()
+    click.echo(f'Recommendations for {books:,} books ({time.perf_counter() - started:.1f}s)')
+
+@click.command('worker')
+@click.option('--threads', type=int, default=2, help='Jobs run concurrently.')
+@click.option('--once', is_flag=True, help='Run the jobs that are due, then exit.')
+@with_appcontext
+def worker_command(threads, once):
+    """Run queued background jobs until interrupted."""
+    worker = Worker(current_app._get_current_object(), threads)
+    if once:
+        count = worker.run_pending()
+        click.echo(f'Ran {count} jobs; queue: {queue_stats()}')
+        return
+    click.echo(f'Worker running with {threads} threads, queue: {queue_stats()}')
+    worker.start()
+    try:
+        while not worker.stopping.wait(1):
+            pass
+    except KeyboardInterrupt:
+        click.echo('Stopping after the current jobs')
+        worker.stop()
@@ -0,0 +1,107 @@
+"""Response compression
+
+Text responses are compressed with brotli when the client accepts it and the
+optional ``brotli`` package is installed, otherwise with gzip. Streamed
+responses are compressed as they go: the first chunk is flushed at once, so
+the browser still receives the top of a long page early, and later chunks
+are flushed every ``COMPRESSION_STREAM_BUFFER`` bytes, so exports yielding a
+row at a time still compress well. Files sent with ``send_file`` (static
+assets) and tiny bodies are left alone.
+
+A strong ETag names exact bytes, so a compressed response gets its own,
+the original tag with the encoding appended, and a matching
+``If-None-Match`` is answered with 304 here. Weak ETags are kept as they are.
+"""
+import gzip
+import zlib
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+def _accepts(request, encoding):
+    return request.accept_encodings[encoding] > 0
+
+def _buffered(chunks, buffer_size):
+    """Yield (bytes, flush) pairs, flushing the first chunk and then every buffer_size bytes"""
+    pending = 0
+    for number, chunk in enumerate(chunks):
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        pending += len(chunk)
+        flush = number == 0 or pending >= buffer_size
+        if flush:
+            pending = 0
+        yield chunk, flush
+
+def _gzip_stream(chunks, level, buffer_size):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk, flush in _buffered(chunks, buffer_size):
+        data = compressor.compress(chunk)
+        if flush:
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def _brotli_stream(chunks, quality, buffer_size):
+    compressor = brotli.Compressor(quality=quality)
+    for chunk, flush in _buffered(chunks, buffer_size):
+        data = compressor.process(chunk)
+        if flush:
+            data += compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+def compress_response(response, request, config):
+    """Compress response in place if the client and content allow it"""
+    if (response.status_code < 200 or response.status_code in (204, 304)
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in config['COMPRESSION_MIMETYPES']):
+        return response
+
+    if brotli is not None and _accepts(request, 'br'):
+        encoding = 'br'
+    elif _accepts(request, 'gzip'):
+        encoding = 'gzip'
+    else:
+        response.vary.add('Accept-Encoding')
+        return response
+
+    if response.is_streamed:
+        buffer_size = config['COMPRESSION_STREAM_BUFFER']
+        if encoding == 'br':
+            response.response = _brotli_stream(response.response, config['COMPRESSION_BROTLI_QUALITY'], buffer_size)
+        else:
+            response.response = _gzip_stream(response.response, config['COMPRESSION_LEVEL'], buffer_size)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < config['COMPRESSION_MIN_SIZE']:
+            return response
+        if encoding == 'br':
+            data = brotli.compress(data, quality=config['COMPRESSION_BROTLI_QUALITY'])
+        else:
+            data = gzip.compress(data, config['COMPRESSION_LEVEL'], mtime=0)
+        response.set_data(data)
+
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f'{etag}-{encoding}')
+        response.make_conditional(request)
+    return response
+
+def init_compression(app):
+    """Compress eligible responses on their way out"""
+    if not app.config['COMPRESSION_ENABLED']:
+        return
+
+    @app.after_request
+    def compress(response):
+        return compress_response(response, request, app.config)
@@ -0,0 +1,55 @@
+"""Database engine tuning
+
+Pool settings are derived from config before the engine is created, and
+SQLite pragmas are applied by a ``connect`` event hook so that every pooled
+connection gets the same journal mode, sync level and busy timeout.
+"""
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from app.models import db
+from app.migrations import run_migrations
+from app.search import init_search_index
+
+def engine_options(config):
+    """Build SQLALCHEMY_ENGINE_OPTIONS for the configured database"""
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        # In-memory databases live in one connection; Flask-SQLAlchemy pins it
+        return {}
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+
+def init_engine_options(app):
+    """Fill in pool settings unless the app sets its own engine options"""
+    if not app.config.get('SQLALCHEMY_ENGINE_OPTIONS'):
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+
+def configure_engine(app):
+    """Register connection hooks on the app's engine; call after db.init_app"""
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return
+
+    journal_mode = app.config['SQLITE_JOURNAL_MODE']
+    synchronous = app.config['SQLITE_SYNCHRONOUS']
+    busy_timeout = int(app.config['SQLITE_BUSY_TIMEOUT_MS'])
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f'PRAGMA journal_mode={journal_mode}')
+        cursor.execute(f'PRAGMA synchronous={synchronous}')
+        cursor.execute(f'PRAGMA busy_timeout={busy_timeout}')
+        cursor.close()
+
+def init_db():
+    """Apply migrations, create missing tables and set up the search index"""
+    run_migrations()
+    db.create_all()
+    init_search_index()
@@ -0,0 +1,79 @@
+"""Request-scoped current user
+
+``current_user()`` loads the logged-in user at most once per request and
+keeps it in ``g``. With ``IDENTITY_CACHE_TTL`` set, the user's display
+columns (name, email) are cached briefly, and each request only reads
+``role`` and ``session_version`` by primary key; the ``User`` is attached
+to the session from those, and the password hash still loads on first
+access. Authorization therefore never trusts a cached value, whichever
+process or worker changed the row.
+
+Each login records the user's ``session_version``. Bumping it (see
+``end_other_sessions``) ends all other sessions of that user on their next
+request, and role checks always use the loaded user rather than the cookie.
+"""
+from flask import g, session, current_app
+from sqlalchemy import select
+from sqlalchemy.orm import make_transient_to_detached
+from app.models import db, User
+from app.cache import cache
+
+# Only display fields are cached; role and session_version are always read
+_DISPLAY_FIELDS = ('id', 'name', 'email', 'created_at')
+
+def _identity_key(user_id):
+    return f'identity:{user_id}'
+
+def _load_user(user_id):
+    ttl = current_app.config['IDENTITY_CACHE_TTL']
+    if ttl:
+        fields = cache.get(_identity_key(user_id))
+        if fields is not None:
+            access = db.session.execute(
+                select(User.role, User.session_version).where(User.id == user_id)
+            ).one_or_none()
+            if access is None:
+                cache.delete(_identity_key(user_id))
+                return None
+            user = User(**fields, role=access.role, session_version=access.session_version)
+            make_transient_to_detached(user)
+            db.session.add(user)
+            return user
+    user = db.session.get(User, user_id)
+    if user is not None and ttl:
+        cache.set(_identity_key(user_id), {name: getattr(user, name) for name in _DISPLAY_FIELDS}, ttl)
+    return user
+
+def current_user():
+    """The logged-in User, or None if the session is missing or outdated"""
+    if 'current_user' not in g:
+        user = None
+        user_id = session.get('user_id')
+        if user_id is not None:
+            user = _load_user(user_id)
+            if user is None or user.session_version != session.get('session_version', 1):
+                session.clear()
+                user = None
+            elif session.get('user_role') != user.role:
+                # Keep the navigation in line with role changes
+                session['user_role'] = user.role
+        g.current_user = user
+    return g.current_user
+
+def login_user(user):
+    """Start a session for user"""
+    session['user_id'] = user.id
+    session['user_name'] = user.name
+    session['user_role'] = user.role
+    session['session_version'] = user.session_version
+    g.current_user = user
+
+def invalidate_identity(user_id):
+    """Drop the cached identity after a user's name or email changes"""
+    cache.delete(_identity_key(user_id))
+
+def end_other_sessions(user):
+    """Bump user's session_version so only the current session stays valid"""
+    user.session_version = (user.session_version or 1) + 1
+    if session.get('user_id') == user.id:
+        session['session_version'] = user.session_version
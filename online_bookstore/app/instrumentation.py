@@ -0,0 +1,161 @@
+"""Request performance instrumentation
+
+Every request records its wall time, the number of SQL statements it ran and
+the time spent in the database (via SQLAlchemy cursor events). The numbers
+are returned in a ``Server-Timing`` header, slow requests, slow queries and
+requests with suspiciously many queries (usually an N+1) are logged as JSON
+lines on the ``bookstore.performance`` logger, and per-endpoint latency
+histograms are served in Prometheus text format at ``/metrics``. Streamed
+pages are recorded when their body has been sent, so rendering counts too;
+they have no ``Server-Timing`` header, since headers go out first.
+
+Metrics are kept per process; with several workers scrape each one or put
+them behind a multiprocess-aware collector.
+"""
+import json
+import logging
+import threading
+import time
+from flask import g, request, has_app_context, Response
+from sqlalchemy import event
+from app.models import db
+
+logger = logging.getLogger('bookstore.performance')
+
+# Histogram buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Metrics:
+    """Thread-safe per-endpoint request metrics"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._latency = {}
+        self._requests = {}
+        self._db_queries = {}
+        self._db_seconds = {}
+
+    def observe(self, endpoint, method, status, seconds, queries, db_seconds):
+        """Record one finished request"""
+        with self._lock:
+            histogram = self._latency.setdefault(endpoint, {
+                'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0
+            })
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram['counts'][i] += 1
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+            key = (endpoint, method, status)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            self._db_queries[endpoint] = self._db_queries.get(endpoint, 0) + queries
+            self._db_seconds[endpoint] = self._db_seconds.get(endpoint, 0.0) + db_seconds
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            lines.append('# HELP bookstore_request_duration_seconds Request latency by endpoint')
+            lines.append('# TYPE bookstore_request_duration_seconds histogram')
+            for endpoint, histogram in sorted(self._latency.items()):
+                for bound, count in zip(self.buckets, histogram['counts']):
+                    lines.append(f'bookstore_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}')
+                lines.append(f'bookstore_request_duration_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} {histogram["count"]}')
+                lines.append(f'bookstore_request_duration_seconds_sum{{endpoint="{endpoint}"}} {histogram["sum"]:.6f}')
+                lines.append(f'bookstore_request_duration_seconds_count{{endpoint="{endpoint}"}} {histogram["count"]}')
+
+            lines.append('# HELP bookstore_requests_total Requests by endpoint, method and status')
+            lines.append('# TYPE bookstore_requests_total counter')
+            for (endpoint, method, status), count in sorted(self._requests.items()):
+                lines.append(f'bookstore_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}')
+
+            lines.append('# HELP bookstore_db_queries_total SQL statements executed by endpoint')
+            lines.append('# TYPE bookstore_db_queries_total counter')
+            for endpoint, count in sorted(self._db_queries.items()):
+                lines.append(f'bookstore_db_queries_total{{endpoint="{endpoint}"}} {count}')
+
+            lines.append('# HELP bookstore_db_seconds_total Time spent in SQL by endpoint')
+            lines.append('# TYPE bookstore_db_seconds_total counter')
+            for endpoint, seconds in sorted(self._db_seconds.items()):
+                lines.append(f'bookstore_db_seconds_total{{endpoint="{endpoint}"}} {seconds:.6f}')
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
+
+def log_event(event_name, **fields):
+    """Write one structured performance event"""
+    logger.warning(json.dumps({'event': event_name, **fields}, default=str))
+
+def _register_engine_events(app, engine):
+    slow_query_seconds = app.config['SLOW_QUERY_MS'] / 1000.0
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        if has_app_context() and 'db_queries' in g:
+            g.db_queries += 1
+            g.db_seconds += elapsed
+        if elapsed >= slow_query_seconds:
+            log_event('slow_query', duration_ms=round(elapsed * 1000, 2),
+                      statement=' '.join(statement.split())[:500], executemany=executemany)
+
+def init_instrumentation(app):
+    """Wire timing hooks, engine events and the /metrics endpoint into app"""
+    if not app.config.get('INSTRUMENTATION_ENABLED', True):
+        return
+
+    with app.app_context():
+        _register_engine_events(app, db.engine)
+
+    slow_request_seconds = app.config['SLOW_REQUEST_MS'] / 1000.0
+    query_count_warning = app.config['QUERY_COUNT_WARNING']
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+        g.db_queries = 0
+        g.db_seconds = 0.0
+
+    def finish(stats, endpoint, method, path, status, response=None):
+        elapsed = time.perf_counter() - stats.request_start
+        metrics.observe(endpoint, method, status, elapsed, stats.db_queries, stats.db_seconds)
+
+        if response is not None and app.config['SERVER_TIMING_ENABLED']:
+            response.headers['Server-Timing'] = (
+                f'db;dur={stats.db_seconds * 1000:.2f};desc="{stats.db_queries} queries", '
+                f'total;dur={elapsed * 1000:.2f}'
+            )
+
+        fields = dict(endpoint=endpoint, method=method, path=path,
+                      status=status, duration_ms=round(elapsed * 1000, 2),
+                      db_queries=stats.db_queries, db_ms=round(stats.db_seconds * 1000, 2))
+        if elapsed >= slow_request_seconds:
+            log_event('slow_request', **fields)
+        if stats.db_queries > query_count_warning:
+            log_event('query_count', **fields)
+
+    @app.after_request
+    def record_request(response):
+        if 'request_start' not in g:
+            return response
+        args = (g._get_current_object(), request.endpoint or '<unmatched>',
+                request.method, request.path, response.status_code)
+        if response.is_streamed:
+            # The template renders while the body is sent, after this hook:
+            # record once it is done. Headers are gone by then, so streamed
+            # pages have no Server-Timing; /metrics and the logs cover them.
+            response.call_on_close(lambda: finish(*args))
+        else:
+            finish(*args, response)
+        return response
+
+    if app.config.get('METRICS_ENABLED', True):
+        @app.route('/metrics')
+        def metrics_endpoint():
+            """Prometheus scrape endpoint"""
+            return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
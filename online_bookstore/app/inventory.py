@@ -0,0 +1,66 @@
+"""Atomic stock reservation
+
+Stock is changed with a single conditional UPDATE instead of a Python
+read-modify-write, so concurrent checkouts on different workers can never
+oversell: the database applies the check and the decrement together and the
+affected row count tells us whether the reservation succeeded.
+"""
+from sqlalchemy import update, bindparam
+from app.models import db, Book
+
+def reserve_stock(book_id, quantity):
+    """Take quantity units of a book's stock, returning False if not enough is left"""
+    result = db.session.execute(
+        update(Book)
+        .where(Book.id == book_id, Book.stock >= quantity)
+        .values(stock=Book.stock - quantity)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+def release_stock(book_id, quantity):
+    """Return quantity units of a book to stock"""
+    db.session.execute(
+        update(Book)
+        .where(Book.id == book_id)
+        .values(stock=Book.stock + quantity)
+        .execution_options(synchronize_session=False)
+    )
+
+_books = Book.__table__
+
+# Executed once per line with executemany, so a whole cart is one round-trip
+_reserve_many = (
+    update(_books)
+    .where(_books.c.id == bindparam('b_id'), _books.c.stock >= bindparam('b_quantity'))
+    .values(stock=_books.c.stock - bindparam('b_quantity'))
+)
+_release_many = (
+    update(_books)
+    .where(_books.c.id == bindparam('b_id'))
+    .values(stock=_books.c.stock + bindparam('b_quantity'))
+)
+
+def _batch_params(quantities):
+    # Lock rows in a stable order so concurrent checkouts cannot deadlock
+    return [{'b_id': book_id, 'b_quantity': quantity}
+            for book_id, quantity in sorted(quantities.items())]
+
+def reserve_many(quantities):
+    """Reserve stock for a {book_id: quantity} map, returning False unless every line fits
+
+    The caller must roll back on False, since lines that did fit were decremented.
+    """
+    params = _batch_params(quantities)
+    if not params:
+        return True
+    if not db.engine.dialect.supports_sane_multi_rowcount:
+        return all(reserve_stock(p['b_id'], p['b_quantity']) for p in params)
+    result = db.session.execute(_reserve_many, params)
+    return result.rowcount == len(params)
+
+def release_many(quantities):
+    """Return stock for a {book_id: quantity} map"""
+    params = _batch_params(quantities)
+    if params:
+        db.session.execute(_release_many, params)
@@ -0,0 +1,250 @@
+"""Background jobs stored in the database
+
+Work that does not have to finish before the response (emails, reports,
+analytics) is queued with ``enqueue`` in the same transaction as the change
+that caused it, so a job exists exactly when that change was committed. Jobs
+are rows in the ``jobs`` table; no broker is needed.
+
+Workers claim due jobs with a conditional UPDATE, so several threads or
+processes can poll the same table without running a job twice. A job that
+raises is retried with exponential backoff until ``max_attempts``, then left
+as ``failed`` with its error; what a finished task returns is kept as JSON
+in ``result``. Jobs whose worker died are put back in the queue once their
+lease (``JOBS_LEASE_SECONDS``) expires.
+
+Run workers with ``flask worker``, or inside the web process with
+``JOBS_WORKER_THREADS``. Workers also queue the periodic jobs listed in
+``JOBS_SCHEDULE`` (job name -> interval in seconds), once per interval
+across all of them.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, delete, insert
+from sqlalchemy.dialects import sqlite, postgresql
+from app.models import db, Job
+
+logger = logging.getLogger('bookstore.jobs')
+
+# Task name -> (function, max attempts)
+TASKS = {}
+
+_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+def task(name, max_attempts=5):
+    """Register a function as a job; it is called with the payload as keyword arguments"""
+    def register(f):
+        TASKS[name] = (f, max_attempts)
+        return f
+    return register
+
+def enqueue(name, payload=None, key=None, delay=0):
+    """Queue a job in the current transaction; the caller commits
+
+    With ``key``, enqueueing the same key again is a no-op. Returns the new
+    job's id, or None if the key was already queued.
+    """
+    if name not in TASKS:
+        raise KeyError(f'Unknown job {name!r}')
+    row = {
+        'name': name,
+        'payload': json.dumps(payload or {}),
+        'status': 'queued',
+        'idempotency_key': key,
+        'attempts': 0,
+        'max_attempts': TASKS[name][1],
+        'run_at': datetime.utcnow() + timedelta(seconds=delay),
+        'created_at': datetime.utcnow(),
+    }
+    dialect_insert = _INSERTS.get(db.engine.dialect.name)
+    if key is None:
+        result = db.session.execute(insert(Job.__table__), row)
+    elif dialect_insert is not None:
+        result = db.session.execute(dialect_insert(Job.__table__).on_conflict_do_nothing(
+            index_elements=['idempotency_key']), row)
+    elif not db.session.scalar(select(Job.id).where(Job.idempotency_key == key)):
+        result = db.session.execute(insert(Job.__table__), row)
+    else:
+        return None
+    return result.inserted_primary_key[0] if result.rowcount == 1 else None
+
+def claim(worker_id):
+    """Mark the oldest due job as running for worker_id and return it, or None"""
+    while True:
+        job_id = db.session.scalar(
+            select(Job.id).where(Job.status == 'queued', Job.run_at <= datetime.utcnow())
+            .order_by(Job.run_at, Job.id).limit(1)
+        )
+        if job_id is None:
+            db.session.rollback()
+            return None
+        # Only one worker's UPDATE can match while the job is still queued
+        claimed = db.session.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == 'queued')
+            .values(status='running', locked_by=worker_id, locked_at=datetime.utcnow(),
+                    attempts=Job.attempts + 1)
+            .execution_options(synchronize_session=False)
+        ).rowcount == 1
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, job_id)
+
+def _finish(claim, **values):
+    """Update a job only while the claim that ran it still holds; returns False otherwise"""
+    job_id, locked_by, attempts = claim
+    return db.session.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.status == 'running', Job.locked_by == locked_by,
+               Job.attempts == attempts)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    ).rowcount == 1
+
+def run_job(job, retry_base_seconds=5):
+    """Run a claimed job and record the outcome
+
+    On success the job is marked done in the same transaction as the
+    task's own writes, so a finished job's effects are applied exactly once.
+    If the lease expired meanwhile (the job was requeued, claimed by another
+    worker, or superseded), those writes are rolled back instead.
+    """
+    # Read before the task runs: after a rollback the row may show another claim
+    job_id, name, attempts, max_attempts = job.id, job.name, job.attempts, job.max_attempts
+    claim = (job_id, job.locked_by, attempts)
+    function = TASKS.get(name, (None,))[0]
+    try:
+        if function is None:
+            raise KeyError(f'Unknown job {name!r}')
+        result = function(**json.loads(job.payload))
+        if not _finish(claim, status='done', finished_at=datetime.utcnow(), last_error=None,
+                       result=None if result is None else json.dumps(result)):
+            db.session.rollback()
+            logger.warning('job %s (%s) lost its lease; its changes were discarded', job_id, name)
+            return False
+        db.session.commit()
+        return True
+    except Exception as e:
+        db.session.rollback()
+        error = f'{type(e).__name__}: {e}'
+        logger.warning('job %s (%s) attempt %d failed: %s', job_id, name, attempts, error)
+        if attempts < max_attempts:
+            values = dict(status='queued', locked_by=None, locked_at=None,
+                          run_at=datetime.utcnow() + timedelta(seconds=retry_base_seconds * 2 ** (attempts - 1)))
+        else:
+            values = dict(status='failed', finished_at=datetime.utcnow())
+        _finish(claim, last_error=error, **values)
+        db.session.commit()
+        return False
+
+def requeue_expired(lease_seconds):
+    """Put running jobs whose worker stopped responding back in the queue"""
+    result = db.session.execute(
+        update(Job)
+        .where(Job.status == 'running', Job.locked_at < datetime.utcnow() - timedelta(seconds=lease_seconds))
+        .values(status='queued', locked_by=None, locked_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
+
+def purge_finished(retention_hours):
+    """Delete done jobs older than retention_hours; failed jobs are kept for inspection"""
+    result = db.session.execute(
+        delete(Job)
+        .where(Job.status == 'done', Job.finished_at < datetime.utcnow() - timedelta(hours=retention_hours))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
+
+def schedule_periodic(schedule):
+    """Queue each scheduled job once for the current interval; the caller commits"""
+    now = time.time()
+    for name, seconds in schedule.items():
+        # The key names the interval, so every worker queues the same job
+        enqueue(name, key=f'{name}@{int(now // seconds)}')
+
+def queue_stats():
+    """{status: number of jobs}"""
+    return dict(db.session.execute(select(Job.status, db.func.count(Job.id)).group_by(Job.status)).all())
+
+class Worker:
+    """Pool of threads that run queued jobs until stopped"""
+
+    def __init__(self, app, threads=1):
+        self.app = app
+        self.threads = threads
+        self.poll_interval = app.config['JOBS_POLL_INTERVAL']
+        self.retry_base_seconds = app.config['JOBS_RETRY_BASE_SECONDS']
+        self.lease_seconds = app.config['JOBS_LEASE_SECONDS']
+        self.retention_hours = app.config['JOBS_RETENTION_HOURS']
+        self.schedule = app.config.get('JOBS_SCHEDULE', {})
+        self.stopping = threading.Event()
+        self._threads = []
+        self._housekeeping_due = 0.0
+        self._housekeeping_lock = threading.Lock()
+
+    def _worker_id(self, index):
+        return f'{socket.gethostname()}:{os.getpid()}:{index}'
+
+    def _housekeeping(self):
+        # Runs at most once a minute across all threads
+        with self._housekeeping_lock:
+            if time.monotonic() < self._housekeeping_due:
+                return
+            self._housekeeping_due = time.monotonic() + 60
+        requeue_expired(self.lease_seconds)
+        purge_finished(self.retention_hours)
+        schedule_periodic(self.schedule)
+        db.session.commit()
+
+    def run_pending(self, worker_id='main'):
+        """Run due jobs until none is left; returns the number run"""
+        count = 0
+        with self.app.app_context():
+            while not self.stopping.is_set():
+                job = claim(worker_id)
+                if job is None:
+                    break
+                run_job(job, self.retry_base_seconds)
+                count += 1
+        return count
+
+    def _loop(self, index):
+        worker_id = self._worker_id(index)
+        while not self.stopping.is_set():
+            try:
+                with self.app.app_context():
+                    self._housekeeping()
+                if not self.run_pending(worker_id):
+                    self.stopping.wait(self.poll_interval)
+            except Exception:
+                logger.exception('job worker %s error', worker_id)
+                self.stopping.wait(self.poll_interval)
+
+    def start(self):
+        """Start the worker threads in the background"""
+        for index in range(self.threads):
+            thread = threading.Thread(target=self._loop, args=(index,), daemon=True,
+                                      name=f'job-worker-{index}')
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        """Ask the threads to finish their current job and wait for them"""
+        self.stopping.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+def init_jobs(app):
+    """Start JOBS_WORKER_THREADS in-process workers, if configured"""
+    threads = app.config.get('JOBS_WORKER_THREADS', 0)
+    if threads:
+        worker = Worker(app, threads)
+        worker.start()
+        app.extensions['job_worker'] = worker
@@ -0,0 +1,84 @@
+"""Schema upgrades for existing SQLite databases
+
+``db.create_all`` only creates missing tables, so changes to existing tables
+are applied here. Each migration runs once, tracked by SQLite's
+``PRAGMA user_version``; fresh databases just record the latest version.
+Indexes declared on the models are created on every run instead, so adding
+one needs no new migration.
+"""
+from sqlalchemy import inspect, text
+from app.models import db, Order, OrderItem
+
+def _split_order_items(connection):
+    """Move the single book/quantity of legacy orders into order_items"""
+    columns = {column['name'] for column in inspect(connection).get_columns('orders')} \
+        if inspect(connection).has_table('orders') else set()
+    if 'book_id' not in columns:
+        return
+    connection.execute(text('ALTER TABLE orders RENAME TO orders_legacy'))
+    db.metadata.create_all(connection, tables=[Order.__table__, OrderItem.__table__])
+    connection.execute(text(
+        'INSERT INTO orders (id, user_id, status, total_price, created_at) '
+        'SELECT id, user_id, status, total_price, created_at FROM orders_legacy'
+    ))
+    connection.execute(text(
+        'INSERT INTO order_items (order_id, book_id, quantity, unit_price) '
+        'SELECT id, book_id, quantity, total_price / quantity FROM orders_legacy'
+    ))
+    connection.execute(text('DROP TABLE orders_legacy'))
+
+def _create_missing_indexes(connection):
+    """Add indexes declared on the models to tables created before them"""
+    inspector = inspect(connection)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+def _add_user_session_version(connection):
+    """Add users.session_version to databases created before it"""
+    inspector = inspect(connection)
+    if not inspector.has_table('users'):
+        return
+    if 'session_version' not in {column['name'] for column in inspector.get_columns('users')}:
+        connection.execute(text(
+            'ALTER TABLE users ADD COLUMN session_version INTEGER NOT NULL DEFAULT 1'
+        ))
+
+def _add_version_columns(connection):
+    """Add the optimistic locking version to books and orders"""
+    inspector = inspect(connection)
+    for table in ('books', 'orders'):
+        if not inspector.has_table(table):
+            continue
+        if 'version' not in {column['name'] for column in inspector.get_columns(table)}:
+            connection.execute(text(
+                f'ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 1'
+            ))
+
+def _add_job_result(connection):
+    """Add jobs.result to databases created before it"""
+    inspector = inspect(connection)
+    if inspector.has_table('jobs') and 'result' not in {column['name'] for column in inspector.get_columns('jobs')}:
+        connection.execute(text('ALTER TABLE jobs ADD COLUMN result TEXT'))
+
+MIGRATIONS = [
+    _split_order_items,
+    # Now also run on every upgrade; kept so later version numbers hold
+    _create_missing_indexes,
+    _add_user_session_version,
+    _add_version_columns,
+    _add_job_result,
+]
+
+def run_migrations():
+    """Apply pending migrations and add missing indexes; call before db.create_all()"""
+    with db.engine.begin() as connection:
+        if connection.dialect.name == 'sqlite':
+            version = connection.execute(text('PRAGMA user_version')).scalar()
+            for number, migration in enumerate(MIGRATIONS, start=1):
+                if number > version:
+                    migration(connection)
+            connection.execute(text(f'PRAGMA user_version = {len(MIGRATIONS)}'))
+        _create_missing_indexes(connection)
@@ -1,6 +1,6 @@
 """Database models with relationships"""
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.passwords import hasher
 from datetime import datetime
 
 db = SQLAlchemy()
@@ -15,17 +15,33 @@ class User(db.Model):
     password_hash = db.Column(db.String(200), nullable=False)
     role = db.Column(db.String(20), default='customer')  # customer or admin
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Bumped to invalidate existing login sessions (see app.identity)
+    session_version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     
-    # Relationship: One user can have many orders
-    orders = db.relationship('Order', backref='user', lazy=True, cascade='all, delete-orphan')
+    # Relationship: One user can have many orders. Dynamic, so callers
+    # filter, count and limit in SQL instead of loading the full history.
+    orders = db.relationship('Order', backref='user', lazy='dynamic', cascade='all, delete-orphan')
     
     def set_password(self, password):
         """Hash and set user password"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hasher.hash(password)
     
     def check_password(self, password):
         """Verify password against hash"""
-        return check_password_hash(self.password_hash, password)
+        return hasher.verify(self.password_hash, password)
+    
+    def order_summary(self):
+        """Return (number of orders, total spent) computed in SQL"""
+        count, total = db.session.query(
+            db.func.count(Order.id), db.func.coalesce(db.func.sum(Order.total_price), 0)
+        ).filter(Order.user_id == self.id).one()
+        return count, total
+    
+    def recent_orders(self, limit=5):
+        """Newest orders with their items and books eagerly loaded"""
+        return self.orders.options(
+            db.selectinload(Order.items).joinedload(OrderItem.book)
+        ).order_by(Order.created_at.desc(), Order.id.desc()).limit(limit).all()
 
 class Category(db.Model):
     """Category model for book classification"""
@@ -40,6 +56,12 @@ class Category(db.Model):
 class Book(db.Model):
     """Book model with inventory management"""
     __tablename__ = 'books'
+    __table_args__ = (
+        # Category listings filter on category_id and page by id
+        db.Index('ix_books_category_id_id', 'category_id', 'id'),
+        # "More by this author" recommendations, newest first
+        db.Index('ix_books_author_id', 'author', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -49,18 +71,114 @@ class Book(db.Model):
     description = db.Column(db.Text)
     category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Bumped by every ORM update, which fails with StaleDataError if the row
+    # changed since it was loaded. Stock changes are SQL deltas and skip it.
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    
+    __mapper_args__ = {'version_id_col': version}
     
-    # Relationship: One book can be in many orders
-    orders = db.relationship('Order', backref='book', lazy=True)
+    # Relationship: One book can be in many order lines
+    order_items = db.relationship('OrderItem', backref='book', lazy=True)
 
 class Order(db.Model):
-    """Order model linking users and books"""
+    """Order model grouping the books bought in one checkout"""
     __tablename__ = 'orders'
+    __table_args__ = (
+        # A user's order history, newest first
+        db.Index('ix_orders_user_id_created_at', 'user_id', 'created_at'),
+        # Keyset pages of a user's orders (/orders, /api/v1/orders) go by id
+        db.Index('ix_orders_user_id_id', 'user_id', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    book_id = db.Column(db.Integer, db.ForeignKey('books.id'), nullable=False)
-    quantity = db.Column(db.Integer, nullable=False, default=1)
-    status = db.Column(db.String(20), default='pending')  # pending, completed, cancelled
+    status = db.Column(db.String(20), default='pending', index=True)  # pending, completed, cancelled
     total_price = db.Column(db.Float, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    # Optimistic locking, as for Book
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    
+    __mapper_args__ = {'version_id_col': version}
+    
+    # Relationship: One order has many line items
+    items = db.relationship('OrderItem', backref='order', lazy=True, cascade='all, delete-orphan')
+    
+    @property
+    def quantity(self):
+        """Total number of books in the order"""
+        return sum(item.quantity for item in self.items)
+
+class OrderItem(db.Model):
+    """Order line linking an order to one book"""
+    __tablename__ = 'order_items'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id'), nullable=False, index=True)
+    quantity = db.Column(db.Integer, nullable=False, default=1)
+    unit_price = db.Column(db.Float, nullable=False)
+    
+    @property
+    def subtotal(self):
+        """Line total for this item"""
+        return self.unit_price * self.quantity
+
+class DailyBookSales(db.Model):
+    """Units and revenue per book per day, maintained by app.analytics"""
+    __tablename__ = 'daily_book_sales'
+    
+    day = db.Column(db.Date, primary_key=True)
+    book_id = db.Column(db.Integer, primary_key=True)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+
+class DailyCategorySales(db.Model):
+    """Units and revenue per category per day, maintained by app.analytics"""
+    __tablename__ = 'daily_category_sales'
+    
+    day = db.Column(db.Date, primary_key=True)
+    category_id = db.Column(db.Integer, primary_key=True)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+
+class OrderStatusCount(db.Model):
+    """Number of orders in each status, maintained by app.analytics"""
+    __tablename__ = 'order_status_counts'
+    
+    status = db.Column(db.String(20), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class BookRecommendation(db.Model):
+    """Books often bought together with a book, rebuilt by app.recommendations"""
+    __tablename__ = 'book_recommendations'
+
+    book_id = db.Column(db.Integer, primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    recommended_id = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+class Job(db.Model):
+    """Background job queued by app.jobs"""
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        # Workers pick the oldest due job in a status
+        db.Index('ix_jobs_status_run_at', 'status', 'run_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    # Enqueueing the same key twice creates one job
+    idempotency_key = db.Column(db.String(200), unique=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    # JSON of what the task returned, for jobs whose outcome is shown to users
+    result = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
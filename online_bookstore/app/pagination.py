@@ -0,0 +1,42 @@
+"""Keyset (cursor) pagination helpers
+
+Keyset pagination filters on the last seen key instead of using OFFSET, so
+every page is an index range scan of per_page rows no matter how deep the
+reader has paged.
+"""
+from collections import namedtuple
+
+KeysetPage = namedtuple('KeysetPage', ['items', 'per_page', 'prev_cursor', 'next_cursor'])
+
+def keyset_paginate(query, column, after=None, before=None, per_page=20, descending=False):
+    """Return one page of query ordered by a unique column
+
+    ``after`` continues forward from a cursor and ``before`` walks back from
+    one; the returned cursors are the key values to pass for the adjacent pages.
+    """
+    def forward(cursor):
+        return column < cursor if descending else column > cursor
+
+    def backward(cursor):
+        return column > cursor if descending else column < cursor
+
+    if before is not None:
+        # Walk backwards from the cursor, then restore display order
+        order = column.asc() if descending else column.desc()
+        rows = query.filter(backward(before)).order_by(order).limit(per_page + 1).all()
+        items = list(reversed(rows[:per_page]))
+        has_prev = len(rows) > per_page
+        has_next = True
+    else:
+        if after is not None:
+            query = query.filter(forward(after))
+        order = column.desc() if descending else column.asc()
+        rows = query.order_by(order).limit(per_page + 1).all()
+        items = rows[:per_page]
+        has_prev = after is not None
+        has_next = len(rows) > per_page
+
+    key = column.key
+    prev_cursor = getattr(items[0], key) if items and has_prev else None
+    next_cursor = getattr(items[-1], key) if items and has_next else None
+    return KeysetPage(items, per_page, prev_cursor, next_cursor)
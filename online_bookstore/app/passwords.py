@@ -0,0 +1,87 @@
+"""Password hashing
+
+Hashing is deliberately slow, so it is configurable per environment and
+bounded: at most ``PASSWORD_HASH_MAX_CONCURRENCY`` hashes run at once per
+process, and a request that cannot get a slot within
+``PASSWORD_HASH_WAIT_SECONDS`` gets ``HashingBusy`` instead of queueing
+behind a login burst. With ``PASSWORD_HASH_WORKERS`` > 0 the work runs in a
+process pool so it does not hold the GIL of the web worker; 0 hashes inline.
+
+Hashes record their method, so ``needs_rehash`` can tell when a stored hash
+was made with older settings and the login view upgrades it transparently.
+"""
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+def _method_prefix(method):
+    """The method part werkzeug writes into hashes, with its defaults filled in"""
+    name, *args = method.split(':')
+    if name == 'scrypt' and not args:
+        return 'scrypt:32768:8:1'
+    if name == 'pbkdf2':
+        hash_name = args[0] if args else 'sha256'
+        iterations = args[1] if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{hash_name}:{iterations}'
+    return method
+
+class HashingBusy(Exception):
+    """Raised when no hashing slot frees up in time"""
+
+class PasswordHasher:
+    """Configurable, concurrency-limited password hashing"""
+
+    def __init__(self):
+        self.method = 'pbkdf2:sha256:600000'
+        self.salt_length = 16
+        self.workers = 0
+        self.wait_seconds = None
+        self._slots = threading.BoundedSemaphore(4)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._method_prefix = None
+
+    def init_app(self, app):
+        """Read hashing settings from app config"""
+        self.method = app.config['PASSWORD_HASH_METHOD']
+        self.salt_length = app.config['PASSWORD_SALT_LENGTH']
+        self.workers = app.config['PASSWORD_HASH_WORKERS']
+        self.wait_seconds = app.config['PASSWORD_HASH_WAIT_SECONDS']
+        self._slots = threading.BoundedSemaphore(app.config['PASSWORD_HASH_MAX_CONCURRENCY'])
+        self._method_prefix = None
+        app.extensions['password_hasher'] = self
+
+    def _executor(self):
+        # Created on first use so each forked web worker gets its own pool
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    def _run(self, f, *args):
+        if not self._slots.acquire(timeout=self.wait_seconds):
+            raise HashingBusy()
+        try:
+            if self.workers:
+                return self._executor().submit(f, *args).result()
+            return f(*args)
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        """Return a new hash of password using the configured method"""
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, pwhash, password):
+        """Check password against a stored hash"""
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """True if pwhash was made with a different method, cost or salt length"""
+        if self._method_prefix is None:
+            self._method_prefix = _method_prefix(self.method)
+        method, _, rest = pwhash.partition('$')
+        salt = rest.partition('$')[0]
+        return method != self._method_prefix or len(salt) != self.salt_length
+
+hasher = PasswordHasher()
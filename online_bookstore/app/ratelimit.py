@@ -0,0 +1,156 @@
+"""Rate limiting and admission control for expensive endpoints
+
+``RATELIMIT_LIMITS`` maps endpoint names to token-bucket limits. Each limit
+is ``(scope, requests, seconds)`` with an optional fourth element listing the
+HTTP methods it applies to; the bucket holds ``requests`` tokens and refills
+at ``requests / seconds`` per second, so short bursts are allowed but the
+long-run rate is capped. Scopes are:
+
+* ``'ip'`` - one bucket per client address;
+* ``'user'`` - one bucket per logged-in user (per address for anonymous clients);
+* ``'endpoint'`` - one bucket shared by every client of the endpoint.
+
+Buckets live in a store chosen with ``RATELIMIT_STORAGE``: ``'memory'``
+(per process, the default) or an import path such as
+``'myapp.redis_limits:RedisRateLimitStore'`` for any class implementing
+``RateLimitStore``, so several workers can share their buckets.
+
+On top of that, at most ``ADMISSION_MAX_CONCURRENCY`` requests to
+``ADMISSION_ENDPOINTS`` run at once per process; a request that cannot get a
+slot within ``ADMISSION_WAIT_SECONDS`` is turned away with a 503. Both checks
+run before the view, so a rejected request costs no database work, and both
+answers carry ``Retry-After``.
+
+Client addresses come from ``request.remote_addr``; behind a reverse proxy,
+wrap the app in werkzeug's ``ProxyFix`` so that is the real client.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from flask import request, session, g
+from werkzeug.exceptions import TooManyRequests, ServiceUnavailable
+from werkzeug.utils import import_string
+
+class RateLimitStore:
+    """Interface a token-bucket store has to implement"""
+
+    def take(self, key, capacity, refill_rate):
+        """Take one token from the bucket at key, creating it full if needed
+
+        Returns 0 when a token was taken, otherwise the number of seconds
+        until one is available. Shared stores must do this atomically, e.g.
+        in a Lua script on Redis.
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        """Forget every bucket"""
+        raise NotImplementedError
+
+class MemoryRateLimitStore(RateLimitStore):
+    """Thread-safe in-process buckets, dropping the least recently used ones"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, refill_rate):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / refill_rate
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            # A dropped bucket comes back full, so eviction only ever forgives
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+STORES = {
+    'memory': MemoryRateLimitStore,
+}
+
+def _client_key(scope):
+    if scope == 'endpoint':
+        return 'all'
+    if scope == 'user' and session.get('user_id'):
+        return f'user:{session["user_id"]}'
+    return f'ip:{request.remote_addr}'
+
+class RateLimiter:
+    """Token-bucket limits and a concurrency cap applied before views run"""
+
+    def __init__(self):
+        self.enabled = False
+        self.store = MemoryRateLimitStore()
+        self.limits = {}
+        self.admission_endpoints = frozenset()
+        self.wait_seconds = 0
+        self._slots = threading.BoundedSemaphore(1)
+
+    def init_app(self, app):
+        """Read limits from app config and check every request against them"""
+        self.enabled = app.config['RATELIMIT_ENABLED']
+        name = app.config['RATELIMIT_STORAGE']
+        store_class = STORES.get(name) or import_string(name)
+        self.store = store_class(**app.config.get('RATELIMIT_STORAGE_OPTIONS', {}))
+        self.limits = app.config['RATELIMIT_LIMITS']
+        self.admission_endpoints = frozenset(app.config['ADMISSION_ENDPOINTS'])
+        self.wait_seconds = app.config['ADMISSION_WAIT_SECONDS']
+        self._slots = threading.BoundedSemaphore(app.config['ADMISSION_MAX_CONCURRENCY'])
+        app.extensions['rate_limiter'] = self
+        if not self.enabled:
+            return
+        app.before_request(self.check)
+        app.teardown_request(self.release)
+
+    def retry_after(self, endpoint):
+        """Seconds the current client must wait before calling endpoint, 0 if allowed
+
+        Buckets are tried from the client's own to the shared ones and the
+        first refusal stops the request, so a client over its own limit
+        does not use up the tokens shared with everyone else.
+        """
+        limits = sorted(self.limits.get(endpoint, ()), key=lambda limit: limit[0] == 'endpoint')
+        for limit in limits:
+            scope, requests, seconds = limit[:3]
+            if len(limit) > 3 and request.method not in limit[3]:
+                continue
+            key = f'ratelimit:{endpoint}:{scope}:{requests}/{seconds}:{_client_key(scope)}'
+            wait = self.store.take(key, requests, requests / seconds)
+            if wait:
+                return wait
+        return 0
+
+    def check(self):
+        """before_request hook: reject the request early if it is over a limit"""
+        endpoint = request.endpoint
+        if endpoint is None:
+            return
+        wait = self.retry_after(endpoint)
+        if wait:
+            raise TooManyRequests('Too many requests, please slow down and try again shortly',
+                                  retry_after=math.ceil(wait))
+        if endpoint in self.admission_endpoints:
+            if not self._slots.acquire(timeout=self.wait_seconds):
+                raise ServiceUnavailable('The store is very busy right now, please try again in a moment',
+                                         retry_after=max(1, math.ceil(self.wait_seconds)))
+            g.admission_slot = True
+
+    def release(self, exc=None):
+        """teardown_request hook: free the concurrency slot, after any streamed body"""
+        if g.pop('admission_slot', False):
+            self._slots.release()
+
+limiter = RateLimiter()
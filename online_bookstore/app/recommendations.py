@@ -0,0 +1,194 @@
+"""Book recommendations ("customers also bought") from order co-occurrence
+
+``rebuild_recommendations`` counts how often each pair of books appears in
+the same (non-cancelled) order and keeps, for every book, the
+``RECOMMENDATIONS_PER_BOOK`` partners with the highest cosine similarity
+``together / sqrt(orders(a) * orders(b))``, which favours books bought
+*with* this one over books that are simply popular. Pairs seen fewer than
+``RECOMMENDATIONS_MIN_SUPPORT`` times are ignored as noise, and orders with
+more than ``RECOMMENDATIONS_MAX_BASKET`` different books are skipped, since
+they would add a quadratic number of meaningless pairs.
+
+With numpy and scipy installed the counts come from one sparse matrix
+product (orders x books, transposed times itself); otherwise a pure Python
+loop over the orders gives the same result, more slowly. They are imported
+by the rebuild only, so web workers never load them. The top lists are
+written to ``book_recommendations`` in one transaction, so pages keep
+reading the previous lists until the new ones are committed. The rebuild
+runs as a scheduled job (``JOBS_SCHEDULE``) or with
+``flask rebuild-recommendations``.
+
+Pages only read that table, by primary key, and cache the ids they get.
+Books without enough co-purchases (new books, small stores) are topped up
+with books by the same author, then from the same category.
+"""
+import math
+from collections import Counter, defaultdict
+from itertools import groupby
+from operator import itemgetter
+from flask import current_app
+from sqlalchemy import select, insert, delete, func
+from app.cache import cache
+from app.catalog import get_books
+from app.models import db, Book, Order, OrderItem, BookRecommendation
+
+def _order_lines(batch_size=10000):
+    """Stream (order id, book id) for non-cancelled orders, grouped by order"""
+    return db.session.execute(
+        select(OrderItem.order_id, OrderItem.book_id)
+        .join(Order, Order.id == OrderItem.order_id)
+        .where(Order.status != 'cancelled')
+        .order_by(OrderItem.order_id)
+        .execution_options(yield_per=batch_size)
+    )
+
+def _top(book_id, partners, per_book):
+    """Recommendation rows for the best (score, partner id) pairs"""
+    partners.sort(key=lambda pair: (-pair[0], pair[1]))
+    return [{'book_id': book_id, 'rank': rank, 'recommended_id': partner, 'score': round(score, 6)}
+            for rank, (score, partner) in enumerate(partners[:per_book], start=1)]
+
+def _co_purchases_python(lines, per_book, min_support, max_basket):
+    orders = Counter()
+    together = defaultdict(Counter)
+    for _, items in groupby(lines, key=itemgetter(0)):
+        basket = {book_id for _, book_id in items}
+        if len(basket) > max_basket:
+            continue
+        orders.update(basket)
+        for book_id in basket:
+            partners = together[book_id]
+            for other in basket:
+                if other != book_id:
+                    partners[other] += 1
+
+    rows = []
+    for book_id in sorted(together):
+        partners = [(count / math.sqrt(orders[book_id] * orders[other]), other)
+                    for other, count in together[book_id].items() if count >= min_support]
+        rows.extend(_top(book_id, partners, per_book))
+    return rows
+
+def _co_purchases_numpy(lines, per_book, min_support, max_basket):
+    import numpy
+    from scipy import sparse
+    pairs = numpy.fromiter((value for line in lines for value in line), dtype=numpy.int64).reshape(-1, 2)
+    if not len(pairs):
+        return []
+    order_ids, order_index = numpy.unique(pairs[:, 0], return_inverse=True)
+    book_ids, book_index = numpy.unique(pairs[:, 1], return_inverse=True)
+    baskets = sparse.csr_matrix(
+        (numpy.ones(len(pairs), dtype=numpy.int64), (order_index, book_index)),
+        shape=(len(order_ids), len(book_ids))
+    )
+    baskets.sum_duplicates()
+    baskets.data[:] = 1
+    small = numpy.flatnonzero(numpy.diff(baskets.indptr) <= max_basket)
+    baskets = baskets[small]
+
+    together = (baskets.T @ baskets).tocsr()
+    orders = together.diagonal()
+    together.setdiag(0)
+    together.data[together.data < min_support] = 0
+    together.eliminate_zeros()
+
+    # Sort every pair by (book, best score, partner id) at once and keep the
+    # first per_book of each book's run
+    book_of = numpy.repeat(numpy.arange(together.shape[0]), numpy.diff(together.indptr))
+    partner = book_ids[together.indices]
+    scores = together.data / numpy.sqrt(orders[book_of] * orders[together.indices])
+    ranked = numpy.lexsort((partner, -scores, book_of))
+    rank = numpy.arange(len(ranked)) - together.indptr[book_of[ranked]] + 1
+    keep = ranked[rank <= per_book]
+    return [{'book_id': book_id, 'rank': rank, 'recommended_id': partner_id, 'score': round(score, 6)}
+            for book_id, rank, partner_id, score in zip(book_ids[book_of[keep]].tolist(),
+                                                        rank[rank <= per_book].tolist(),
+                                                        partner[keep].tolist(), scores[keep].tolist())]
+
+def rebuild_recommendations(per_book=None, min_support=None, max_basket=None):
+    """Recompute every book's recommendations; the caller commits
+
+    Returns the number of books that have recommendations.
+    """
+    config = current_app.config
+    per_book = per_book or config['RECOMMENDATIONS_PER_BOOK']
+    min_support = min_support or config['RECOMMENDATIONS_MIN_SUPPORT']
+    max_basket = max_basket or config['RECOMMENDATIONS_MAX_BASKET']
+    try:
+        import scipy.sparse  # optional, and brings numpy
+    except ImportError:
+        build = _co_purchases_python
+    else:
+        build = _co_purchases_numpy
+    rows = build(_order_lines(), per_book, min_support, max_basket)
+
+    db.session.execute(delete(BookRecommendation))
+    if rows:
+        db.session.execute(insert(BookRecommendation), rows)
+    return len({row['book_id'] for row in rows})
+
+def _fallback_ids(book, exclude, limit):
+    """Newest books by the same author, then from the same category"""
+    ids = []
+    # Two index range scans, on (author, id) and (category_id, id)
+    for column, value in ((Book.author, book['author']), (Book.category_id, book['category_id'])):
+        if len(ids) < limit:
+            ids += db.session.scalars(
+                select(Book.id)
+                .where(column == value, Book.id.notin_(list(exclude) + ids))
+                .order_by(Book.id.desc())
+                .limit(limit - len(ids))
+            )
+    return ids
+
+def _related_ids(book, limit):
+    ids = list(db.session.scalars(
+        select(BookRecommendation.recommended_id)
+        .where(BookRecommendation.book_id == book['id'])
+        .order_by(BookRecommendation.rank)
+        .limit(limit)
+    ))
+    if len(ids) < limit:
+        ids += _fallback_ids(book, ids + [book['id']], limit - len(ids))
+    return ids
+
+def related_books(book, limit=6):
+    """Books to show next to book (a catalog dict), most related first"""
+    ids = cache.get_or_set(f'recommendations:book:{book["id"]}:{limit}',
+                           lambda: _related_ids(book, limit),
+                           current_app.config['RECOMMENDATIONS_CACHE_TTL'])
+    return get_books(ids)
+
+def _recommended_ids(user_id, limit):
+    bought = list(dict.fromkeys(db.session.scalars(
+        select(OrderItem.book_id)
+        .join(Order, Order.id == OrderItem.order_id)
+        .where(Order.user_id == user_id, Order.status != 'cancelled')
+        .order_by(Order.created_at.desc(), Order.id.desc())
+        .limit(50)
+    )))
+    if not bought:
+        return []
+    score = func.sum(BookRecommendation.score)
+    ids = list(db.session.scalars(
+        select(BookRecommendation.recommended_id)
+        .where(BookRecommendation.book_id.in_(bought),
+               BookRecommendation.recommended_id.notin_(bought))
+        .group_by(BookRecommendation.recommended_id)
+        .order_by(score.desc(), BookRecommendation.recommended_id)
+        .limit(limit)
+    ))
+    if len(ids) < limit:
+        latest = db.session.execute(
+            select(Book.id, Book.author, Book.category_id).where(Book.id == bought[0])
+        ).one_or_none()
+        if latest is not None:
+            ids += _fallback_ids(latest._mapping, ids + bought, limit - len(ids))
+    return ids
+
+def recommended_for(user_id, limit=6):
+    """Books to suggest to a customer from their recent purchases"""
+    ids = cache.get_or_set(f'recommendations:user:{user_id}:{limit}',
+                           lambda: _recommended_ids(user_id, limit),
+                           current_app.config['RECOMMENDATIONS_CACHE_TTL'])
+    return get_books(ids)
@@ -0,0 +1,53 @@
+"""Sales reports for admins, as a page and as JSON"""
+from flask import Blueprint, render_template, request, jsonify
+from app.analytics import top_books, top_categories, daily_sales, status_counts
+from app.catalog import all_categories
+from app.routes.books import admin_required
+
+bp = Blueprint('analytics', __name__, url_prefix='/analytics')
+
+# Longest period a report can cover
+MAX_DAYS = 366
+
+def _days():
+    return max(1, min(request.args.get('days', 30, type=int), MAX_DAYS))
+
+def _limit():
+    return max(1, min(request.args.get('limit', 10, type=int), 100))
+
+@bp.route('/')
+@admin_required
+def index():
+    """Sales dashboard"""
+    days = _days()
+    category_id = request.args.get('category', type=int)
+    return render_template('analytics.html', days=days, category_id=category_id,
+                           categories=all_categories(),
+                           books=top_books(days, _limit()),
+                           top_categories=top_categories(days, _limit()),
+                           series=daily_sales(days, category_id),
+                           statuses=status_counts())
+
+@bp.route('/top-books')
+@admin_required
+def books():
+    """Best sellers by units as JSON"""
+    return jsonify(top_books(_days(), _limit()))
+
+@bp.route('/top-categories')
+@admin_required
+def categories():
+    """Best categories by revenue as JSON"""
+    return jsonify(top_categories(_days(), _limit()))
+
+@bp.route('/daily')
+@admin_required
+def daily():
+    """Daily units and revenue as JSON, optionally for one category"""
+    return jsonify(daily_sales(_days(), request.args.get('category', type=int)))
+
+@bp.route('/statuses')
+@admin_required
+def statuses():
+    """Order counts by status as JSON"""
+    return jsonify(status_counts())
@@ -0,0 +1,139 @@
+"""JSON API for the catalog and the logged-in user's orders
+
+Lists use the same keyset cursors as the HTML pages (``?after=``/``?before=``
+with ``next_cursor``/``prev_cursor`` in the response) and every resource
+accepts ``?fields=id,title,price`` to return only some top-level fields.
+
+Responses carry a strong ETag computed from the serialised body, so a client
+sending it back in ``If-None-Match`` gets an empty 304 when nothing changed.
+Catalog responses are publicly cacheable for ``API_CACHE_MAX_AGE`` seconds;
+order responses are private and always revalidated.
+"""
+import hashlib
+import json
+from flask import Blueprint, request, current_app, jsonify, abort, url_for, Response
+from sqlalchemy.orm import selectinload
+from werkzeug.exceptions import HTTPException
+from app.models import Order, OrderItem
+from app.catalog import book_page, get_book, all_categories
+from app.identity import current_user
+from app.pagination import keyset_paginate
+
+bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+@bp.errorhandler(HTTPException)
+def json_error(e):
+    """Report errors as JSON instead of HTML pages"""
+    # Keep headers such as Retry-After, but not the HTML Content-Type
+    headers = [(name, value) for name, value in e.get_headers() if name != 'Content-Type']
+    return jsonify({'error': e.name, 'message': e.description}), e.code, headers
+
+def _per_page():
+    limit = request.args.get('limit', current_app.config['API_PER_PAGE'], type=int)
+    return max(1, min(limit, current_app.config['API_MAX_PER_PAGE']))
+
+def _select_fields(items, allowed):
+    """Apply ?fields= to a list of dicts, rejecting unknown field names"""
+    fields = request.args.get('fields')
+    if not fields:
+        return items
+    wanted = [name.strip() for name in fields.split(',') if name.strip()]
+    unknown = [name for name in wanted if name not in allowed]
+    if unknown:
+        abort(400, f'Unknown fields: {", ".join(unknown)}')
+    return [{name: item[name] for name in wanted} for item in items]
+
+def _page_links(endpoint, page, **params):
+    return {
+        'prev_cursor': page.prev_cursor,
+        'next_cursor': page.next_cursor,
+        'prev': url_for(endpoint, before=page.prev_cursor, **params) if page.prev_cursor else None,
+        'next': url_for(endpoint, after=page.next_cursor, **params) if page.next_cursor else None,
+    }
+
+def _cached_json(payload, public=True):
+    """JSON response with a strong ETag, answering If-None-Match with 304"""
+    body = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    response = Response(body, mimetype='application/json')
+    response.set_etag(hashlib.sha1(body.encode()).hexdigest())
+    if public:
+        response.headers['Cache-Control'] = f'public, max-age={current_app.config["API_CACHE_MAX_AGE"]}'
+    else:
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.vary.add('Cookie')
+    return response.make_conditional(request)
+
+BOOK_FIELDS = ('id', 'title', 'author', 'price', 'stock', 'description', 'category_id', 'category')
+ORDER_FIELDS = ('id', 'status', 'total_price', 'created_at', 'items')
+
+def order_to_dict(order):
+    """Serialise an order with its lines"""
+    return {
+        'id': order.id,
+        'status': order.status,
+        'total_price': order.total_price,
+        'created_at': order.created_at.isoformat(),
+        'items': [
+            {'book_id': item.book_id, 'title': item.book.title, 'quantity': item.quantity,
+             'unit_price': item.unit_price, 'subtotal': item.subtotal}
+            for item in order.items
+        ],
+    }
+
+@bp.route('/books')
+def books():
+    """Catalog page, optionally within a category"""
+    category_id = request.args.get('category', type=int)
+    page = book_page(
+        category_id=category_id,
+        after=request.args.get('after', type=int),
+        before=request.args.get('before', type=int),
+        per_page=_per_page()
+    )
+    params = {name: request.args[name] for name in ('category', 'limit', 'fields') if name in request.args}
+    return _cached_json({'items': _select_fields(page.items, BOOK_FIELDS),
+                         **_page_links('api.books', page, **params)})
+
+@bp.route('/books/<int:id>')
+def book(id):
+    """One book"""
+    book = get_book(id)
+    if book is None:
+        abort(404, 'Book not found')
+    return _cached_json(_select_fields([book], BOOK_FIELDS)[0])
+
+@bp.route('/categories')
+def categories():
+    """All categories"""
+    return _cached_json({'items': _select_fields(all_categories(), ('id', 'name'))})
+
+@bp.route('/orders')
+def orders():
+    """The logged-in user's orders, newest first"""
+    user = current_user()
+    if user is None:
+        abort(401, 'Login required')
+    page = keyset_paginate(
+        user.orders.options(selectinload(Order.items).joinedload(OrderItem.book)), Order.id,
+        after=request.args.get('after', type=int),
+        before=request.args.get('before', type=int),
+        per_page=_per_page(),
+        descending=True
+    )
+    params = {name: request.args[name] for name in ('limit', 'fields') if name in request.args}
+    items = [order_to_dict(order) for order in page.items]
+    return _cached_json({'items': _select_fields(items, ORDER_FIELDS),
+                         **_page_links('api.orders', page, **params)}, public=False)
+
+@bp.route('/orders/<int:id>')
+def order(id):
+    """One of the logged-in user's orders"""
+    user = current_user()
+    if user is None:
+        abort(401, 'Login required')
+    order = user.orders.options(
+        selectinload(Order.items).joinedload(OrderItem.book)
+    ).filter(Order.id == id).first()
+    if order is None:
+        abort(404, 'Order not found')
+    return _cached_json(_select_fields([order_to_dict(order)], ORDER_FIELDS)[0], public=False)
@@ -1,9 +1,16 @@
 """Authentication routes: login, register, logout"""
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
 from app.models import db, User
+from app.passwords import hasher, HashingBusy
+from app.identity import login_user
 
 bp = Blueprint('auth', __name__, url_prefix='/auth')
 
+def hashing_busy(template, **context):
+    """Render template as a 503 when password hashing is saturated"""
+    flash('We are handling a lot of sign-ins right now, please try again in a moment', 'warning')
+    return render_template(template, **context), 503, {'Retry-After': '5'}
+
 @bp.route('/register', methods=['GET', 'POST'])
 def register():
     """User registration"""
@@ -24,7 +31,10 @@ def register():
         
         # Create new user
         user = User(name=name, email=email, role='customer')
-        user.set_password(password)
+        try:
+            user.set_password(password)
+        except HashingBusy:
+            return hashing_busy('auth/register.html')
         db.session.add(user)
         db.session.commit()
         
@@ -42,11 +52,22 @@ def login():
         
         user = User.query.filter_by(email=email).first()
         
-        if user and user.check_password(password):
-            # Set session
-            session['user_id'] = user.id
-            session['user_name'] = user.name
-            session['user_role'] = user.role
+        try:
+            valid = user is not None and user.check_password(password)
+        except HashingBusy:
+            return hashing_busy('auth/login.html')
+        
+        # Upgrade hashes made with older settings while we have the password;
+        # when hashing is saturated, skip it until the next login
+        if valid and hasher.needs_rehash(user.password_hash):
+            try:
+                user.set_password(password)
+                db.session.commit()
+            except HashingBusy:
+                pass
+        
+        if valid:
+            login_user(user)
             flash(f'Welcome back, {user.name}!', 'success')
             return redirect(url_for('main.dashboard'))
         else:
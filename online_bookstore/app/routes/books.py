@@ -1,7 +1,20 @@
 """Book CRUD operations"""
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
-from app.models import db, Book, Category
+import json
+import os
+import uuid
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, abort, Response, stream_with_context
+from sqlalchemy import case, exists, delete as sql_delete
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.exc import StaleDataError
+from app.models import db, Book, OrderItem, Job
+from app.jobs import enqueue
+from app.pagination import keyset_paginate
+from app.catalog import book_page, get_book, all_categories, invalidate_catalog
+from app.recommendations import related_books
 from app.routes.main import login_required
+from app.identity import current_user
+from app.templating import render_stream
+from app.bulk import FORMATS, ImportReport, format_for, export_books
 
 bp = Blueprint('books', __name__, url_prefix='/books')
 
@@ -10,10 +23,11 @@ def admin_required(f):
     from functools import wraps
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
+        user = current_user()
+        if user is None:
             flash('Please login', 'warning')
             return redirect(url_for('auth.login'))
-        if session.get('user_role') != 'admin':
+        if user.role != 'admin':
             flash('Admin access required', 'danger')
             return redirect(url_for('main.index'))
         return f(*args, **kwargs)
@@ -23,25 +37,34 @@ def admin_required(f):
 def list_books():
     """List all books"""
     category_id = request.args.get('category', type=int)
-    if category_id:
-        books = Book.query.filter_by(category_id=category_id).all()
-    else:
-        books = Book.query.all()
-    categories = Category.query.all()
-    return render_template('books/list.html', books=books, categories=categories)
+    page = book_page(
+        category_id=category_id,
+        after=request.args.get('after', type=int),
+        before=request.args.get('before', type=int),
+        per_page=current_app.config['BOOKS_PER_PAGE']
+    )
+    return render_stream('books/list.html', books=page.items, categories=all_categories(),
+                         page=page, category_id=category_id)
 
 @bp.route('/<int:id>')
 def detail(id):
     """Book detail page"""
-    book = Book.query.get_or_404(id)
-    return render_template('books/detail.html', book=book)
+    book = get_book(id)
+    if book is None:
+        abort(404)
+    return render_template('books/detail.html', book=book, related=related_books(book))
 
 @bp.route('/manage')
 @admin_required
 def manage():
     """Manage books (admin only)"""
-    books = Book.query.all()
-    return render_template('books/manage.html', books=books)
+    page = keyset_paginate(
+        Book.query.options(joinedload(Book.category)), Book.id,
+        after=request.args.get('after', type=int),
+        before=request.args.get('before', type=int),
+        per_page=current_app.config['MANAGE_PER_PAGE']
+    )
+    return render_stream('books/manage.html', books=page.items, page=page)
 
 @bp.route('/create', methods=['GET', 'POST'])
 @admin_required
@@ -63,39 +86,130 @@ def create():
                    description=description, category_id=category_id)
         db.session.add(book)
         db.session.commit()
+        invalidate_catalog()
         flash('Book created successfully', 'success')
         return redirect(url_for('books.manage'))
     
-    categories = Category.query.all()
-    return render_template('books/form.html', categories=categories, book=None)
+    return render_template('books/form.html', categories=all_categories(), book=None)
 
 @bp.route('/edit/<int:id>', methods=['GET', 'POST'])
 @admin_required
 def edit(id):
-    """Edit existing book"""
+    """Edit existing book
+
+    The form carries the version it was loaded at; if the book changed since,
+    the edit is refused with 409 and the form is shown again with the
+    current values next to the submitted ones. Stock is adjusted by a delta,
+    so units sold while the form was open are not overwritten.
+    """
     book = Book.query.get_or_404(id)
     
     if request.method == 'POST':
-        book.title = request.form.get('title')
-        book.author = request.form.get('author')
-        book.price = request.form.get('price', type=float)
-        book.stock = request.form.get('stock', type=int)
-        book.description = request.form.get('description')
-        book.category_id = request.form.get('category_id', type=int)
+        changes = {
+            'title': request.form.get('title'),
+            'author': request.form.get('author'),
+            'price': request.form.get('price', type=float),
+            'description': request.form.get('description'),
+            'category_id': request.form.get('category_id', type=int),
+        }
+        stock_delta = request.form.get('stock_delta', 0, type=int)
+        version = request.form.get('version', type=int)
         
-        db.session.commit()
-        flash('Book updated successfully', 'success')
-        return redirect(url_for('books.manage'))
+        if not all([changes['title'], changes['author'], changes['price'] is not None, changes['category_id']]):
+            flash('All fields are required', 'danger')
+            return redirect(url_for('books.edit', id=id))
+        if book.stock + stock_delta < 0:
+            flash(f'Only {book.stock} in stock; cannot remove {-stock_delta}', 'danger')
+            return redirect(url_for('books.edit', id=id))
+        
+        if version == book.version:
+            for name, value in changes.items():
+                setattr(book, name, value)
+            if stock_delta:
+                # Applied in SQL so concurrent checkouts are kept; never below zero
+                new_stock = Book.stock + stock_delta
+                book.stock = case((new_stock < 0, 0), else_=new_stock)
+            try:
+                db.session.commit()
+            except StaleDataError:
+                db.session.rollback()
+                book = Book.query.get_or_404(id)
+            else:
+                invalidate_catalog(id)
+                flash('Book updated successfully', 'success')
+                return redirect(url_for('books.manage'))
+        
+        flash('This book was changed by someone else while you were editing. '
+              'Review the current values below and submit your changes again.', 'warning')
+        return render_template('books/form.html', categories=all_categories(), book=book,
+                               conflict=dict(changes, stock_delta=stock_delta)), 409
     
-    categories = Category.query.all()
-    return render_template('books/form.html', categories=categories, book=book)
+    return render_template('books/form.html', categories=all_categories(), book=book)
 
 @bp.route('/delete/<int:id>', methods=['POST'])
 @admin_required
 def delete(id):
-    """Delete book"""
-    book = Book.query.get_or_404(id)
-    db.session.delete(book)
+    """Delete a book that no order refers to
+
+    Ordered books stay, so order history and sales reports keep their
+    titles; setting their stock to 0 takes them off sale. The check is part
+    of the DELETE, so an order placed meanwhile still blocks it.
+    """
+    Book.query.get_or_404(id)
+    deleted = db.session.execute(
+        sql_delete(Book)
+        .where(Book.id == id, ~exists().where(OrderItem.book_id == id))
+        .execution_options(synchronize_session=False)
+    ).rowcount == 1
     db.session.commit()
+    if not deleted:
+        flash('This book appears in orders and cannot be deleted; set its stock to 0 to stop selling it', 'danger')
+        return redirect(url_for('books.manage'))
+    invalidate_catalog(id)
     flash('Book deleted successfully', 'success')
     return redirect(url_for('books.manage'))
+
+@bp.route('/import', methods=['GET', 'POST'])
+@admin_required
+def import_catalog():
+    """Queue a bulk insert or update of books from an uploaded CSV or JSON Lines file"""
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Choose a file to import', 'danger')
+            return redirect(url_for('books.import_catalog'))
+        fmt = format_for(upload.filename)
+        directory = current_app.config['IMPORT_UPLOAD_DIR'] or os.path.join(current_app.instance_path, 'imports')
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{uuid.uuid4().hex}.{fmt}')
+        upload.save(path)
+        job_id = enqueue('catalog.import', {'path': path, 'fmt': fmt, 'dry_run': bool(request.form.get('dry_run'))})
+        db.session.commit()
+        flash('Import queued; this page shows the result when it is done', 'info')
+        return redirect(url_for('books.import_status', job_id=job_id))
+    return render_template('books/import.html')
+
+@bp.route('/import/<int:job_id>')
+@admin_required
+def import_status(job_id):
+    """Progress and report of a queued import"""
+    job = db.session.get(Job, job_id)
+    if job is None or job.name != 'catalog.import':
+        abort(404)
+    report = ImportReport(**json.loads(job.result)) if job.result else None
+    return render_template('books/import.html', job=job, dry_run=json.loads(job.payload)['dry_run'],
+                           report=report)
+
+def export_response(export, name, fmt):
+    """Stream an export as a file download"""
+    if fmt not in FORMATS:
+        abort(404)
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(export(fmt)), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={name}.{fmt}'})
+
+@bp.route('/export.<fmt>')
+@admin_required
+def export(fmt):
+    """Download the whole catalog"""
+    return export_response(export_books, 'books', fmt)
@@ -0,0 +1,81 @@
+"""Shopping cart routes
+
+The cart lives in the signed session cookie as a {book_id: quantity} map, so
+adding and removing items only reads the cached catalog; stock is only
+checked and reserved at checkout. Books deleted in the meantime are dropped
+from the cart when it is viewed or checked out.
+"""
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session
+from sqlalchemy.orm import joinedload
+from app.models import Book
+from app.catalog import get_book
+from app.routes.main import login_required
+
+bp = Blueprint('cart', __name__, url_prefix='/cart')
+
+def get_cart():
+    """Return the session cart as {book_id: quantity}"""
+    return {int(book_id): quantity for book_id, quantity in session.get('cart', {}).items()}
+
+def save_cart(cart):
+    """Store the cart back in the session"""
+    session['cart'] = {str(book_id): quantity for book_id, quantity in cart.items() if quantity > 0}
+
+def drop_missing_books(cart, book_ids):
+    """Remove books deleted since they were added, telling the user; returns the cart"""
+    missing = set(cart) - set(book_ids)
+    if missing:
+        cart = {book_id: quantity for book_id, quantity in cart.items() if book_id not in missing}
+        save_cart(cart)
+        flash('Some books in your cart are no longer available and were removed', 'warning')
+    return cart
+
+@bp.route('/')
+@login_required
+def view():
+    """Show cart contents"""
+    cart = get_cart()
+    books = Book.query.options(joinedload(Book.category)).filter(Book.id.in_(cart)).all() if cart else []
+    cart = drop_missing_books(cart, [book.id for book in books])
+    lines = [(book, cart[book.id]) for book in books]
+    total = sum(book.price * quantity for book, quantity in lines)
+    return render_template('cart.html', lines=lines, total=total)
+
+@bp.route('/add/<int:book_id>', methods=['POST'])
+@login_required
+def add(book_id):
+    """Add a book to the cart"""
+    quantity = request.form.get('quantity', 1, type=int)
+    if not quantity or quantity < 1:
+        flash('Please enter a valid quantity', 'danger')
+        return redirect(url_for('books.detail', id=book_id))
+    if get_book(book_id) is None:
+        flash('Book not found', 'danger')
+        return redirect(url_for('books.list_books'))
+    
+    cart = get_cart()
+    cart[book_id] = cart.get(book_id, 0) + quantity
+    save_cart(cart)
+    flash('Added to cart', 'success')
+    return redirect(url_for('cart.view'))
+
+@bp.route('/update', methods=['POST'])
+@login_required
+def update():
+    """Change quantities of items in the cart"""
+    cart = get_cart()
+    for book_id in list(cart):
+        quantity = request.form.get(f'quantity_{book_id}', type=int)
+        if quantity is not None:
+            cart[book_id] = max(quantity, 0)
+    save_cart(cart)
+    return redirect(url_for('cart.view'))
+
+@bp.route('/remove/<int:book_id>', methods=['POST'])
+@login_required
+def remove(book_id):
+    """Remove a book from the cart"""
+    cart = get_cart()
+    cart.pop(book_id, None)
+    save_cart(cart)
+    return redirect(url_for('cart.view'))
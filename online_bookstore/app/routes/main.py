@@ -1,15 +1,24 @@
 """Main application routes"""
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
-from app.models import db, User, Book
+import hashlib
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app
+from app.models import db, User
+from app.search import search_books
+from app.catalog import featured_books
+from app.recommendations import recommended_for
+from app.passwords import HashingBusy
+from app.routes.auth import hashing_busy
+from app.identity import current_user, invalidate_identity, end_other_sessions
+from app.jobs import enqueue
+from app.templating import render_stream
 from functools import wraps
 
 bp = Blueprint('main', __name__)
 
 def login_required(f):
-    """Decorator to protect routes"""
+    """Decorator to protect routes; loads the user into g.current_user"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
+        if current_user() is None:
             flash('Please login to access this page', 'warning')
             return redirect(url_for('auth.login'))
         return f(*args, **kwargs)
@@ -18,22 +27,22 @@ def login_required(f):
 @bp.route('/')
 def index():
     """Home page with featured books"""
-    books = Book.query.limit(9).all()
+    books = featured_books()
     return render_template('index.html', books=books)
 
 @bp.route('/dashboard')
 @login_required
 def dashboard():
     """User dashboard"""
-    user = User.query.get(session['user_id'])
-    recent_orders = user.orders[-5:] if user.orders else []
-    return render_template('dashboard.html', user=user, orders=recent_orders)
+    user = current_user()
+    return render_template('dashboard.html', user=user, orders=user.recent_orders(),
+                           order_count=user.orders.count(), recommended=recommended_for(user.id))
 
 @bp.route('/profile', methods=['GET', 'POST'])
 @login_required
 def profile():
     """User profile management"""
-    user = User.query.get(session['user_id'])
+    user = current_user()
     
     if request.method == 'POST':
         user.name = request.form.get('name')
@@ -50,14 +59,20 @@ def profile():
         # Update password if provided
         new_password = request.form.get('new_password')
         if new_password:
-            user.set_password(new_password)
+            try:
+                user.set_password(new_password)
+            except HashingBusy:
+                db.session.rollback()
+                return hashing_busy('profile.html', user=user, order_count=user.orders.count())
+            end_other_sessions(user)
         
         db.session.commit()
+        invalidate_identity(user.id)
         session['user_name'] = user.name
         flash('Profile updated successfully', 'success')
         return redirect(url_for('main.profile'))
     
-    return render_template('profile.html', user=user)
+    return render_template('profile.html', user=user, order_count=user.orders.count())
 
 @bp.route('/contact', methods=['GET', 'POST'])
 def contact():
@@ -68,6 +83,11 @@ def contact():
         message = request.form.get('message')
         
         if name and email and message:
+            # Keyed on the content so a double submit sends one message
+            digest = hashlib.sha256(f'{email}\n{message}'.encode()).hexdigest()
+            enqueue('mail.contact_message', {'name': name, 'email': email, 'message': message},
+                    key=f'contact:{digest}')
+            db.session.commit()
             flash('Thank you for contacting us! We will get back to you soon.', 'success')
             return redirect(url_for('main.contact'))
         else:
@@ -78,11 +98,12 @@ def contact():
 @bp.route('/search')
 def search():
     """Search books"""
-    query = request.args.get('q', '')
+    query = request.args.get('q', '').strip()
+    page = request.args.get('page', 1, type=int)
     if query:
-        books = Book.query.filter(
-            (Book.title.contains(query)) | (Book.author.contains(query))
-        ).all()
+        results = search_books(query, page=page, per_page=current_app.config['SEARCH_PER_PAGE'])
+        books = results.items
     else:
+        results = None
         books = []
-    return render_template('books/list.html', books=books, search_query=query)
+    return render_stream('books/list.html', books=books, search_query=query, results=results)
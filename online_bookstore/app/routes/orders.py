@@ -1,7 +1,18 @@
 """Order management routes"""
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
-from app.models import db, Order, Book, User
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app
+from sqlalchemy import select, update
+from sqlalchemy.orm import selectinload
+from app.models import db, Book, Order, OrderItem
+from app.inventory import release_many
+from app.catalog import invalidate_books
+from app.jobs import enqueue
+from app.checkout import place_order, CheckoutError
+from app.pagination import keyset_paginate
+from app.routes.cart import get_cart, save_cart, drop_missing_books
 from app.routes.main import login_required
+from app.identity import current_user
+from app.bulk import export_orders
+from app.routes.books import admin_required, export_response
 
 bp = Blueprint('orders', __name__, url_prefix='/orders')
 
@@ -9,38 +20,47 @@ bp = Blueprint('orders', __name__, url_prefix='/orders')
 @login_required
 def list_orders():
     """List user orders"""
-    user = User.query.get(session['user_id'])
-    orders = user.orders
-    return render_template('orders.html', orders=orders)
+    user = current_user()
+    page = keyset_paginate(
+        user.orders.options(selectinload(Order.items).joinedload(OrderItem.book)), Order.id,
+        after=request.args.get('after', type=int),
+        before=request.args.get('before', type=int),
+        per_page=current_app.config['ORDERS_PER_PAGE'],
+        descending=True
+    )
+    order_count, total_spent = user.order_summary()
+    return render_template('orders.html', orders=page.items, page=page,
+                           order_count=order_count, total_spent=total_spent)
+
+@bp.route('/checkout', methods=['POST'])
+@login_required
+def checkout():
+    """Place one order for everything in the cart"""
+    cart = get_cart()
+    if cart:
+        existing = db.session.scalars(select(Book.id).where(Book.id.in_(cart))).all()
+        cart = drop_missing_books(cart, existing)
+    try:
+        place_order(session['user_id'], cart)
+    except CheckoutError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('cart.view'))
+    
+    save_cart({})
+    flash('Order placed successfully!', 'success')
+    return redirect(url_for('orders.list_orders'))
 
 @bp.route('/create/<int:book_id>', methods=['POST'])
 @login_required
 def create(book_id):
-    """Create new order"""
-    book = Book.query.get_or_404(book_id)
+    """Buy a single book immediately, bypassing the cart"""
     quantity = request.form.get('quantity', 1, type=int)
-    
-    # Validate stock
-    if quantity > book.stock:
-        flash('Insufficient stock available', 'danger')
+    try:
+        place_order(session['user_id'], {book_id: quantity})
+    except CheckoutError as e:
+        flash(str(e), 'danger')
         return redirect(url_for('books.detail', id=book_id))
     
-    # Create order
-    total_price = book.price * quantity
-    order = Order(
-        user_id=session['user_id'],
-        book_id=book_id,
-        quantity=quantity,
-        total_price=total_price,
-        status='pending'
-    )
-    
-    # Update stock
-    book.stock -= quantity
-    
-    db.session.add(order)
-    db.session.commit()
-    
     flash('Order placed successfully!', 'success')
     return redirect(url_for('orders.list_orders'))
 
@@ -55,15 +75,29 @@ def cancel(id):
         flash('Unauthorized action', 'danger')
         return redirect(url_for('orders.list_orders'))
     
-    if order.status == 'pending':
-        # Restore stock
-        book = Book.query.get(order.book_id)
-        book.stock += order.quantity
-        
-        order.status = 'cancelled'
+    # Flip the status only if still pending so a double cancel restores stock once
+    result = db.session.execute(
+        update(Order)
+        .where(Order.id == id, Order.status == 'pending')
+        .values(status='cancelled', version=Order.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 1:
+        quantities = {item.book_id: item.quantity for item in order.items}
+        release_many(quantities)
+        enqueue('analytics.order_cancelled', {'order_id': id}, key=f'order-cancelled-analytics:{id}')
+        enqueue('mail.order_cancelled', {'order_id': id}, key=f'order-cancelled-mail:{id}')
         db.session.commit()
+        invalidate_books(quantities)
         flash('Order cancelled successfully', 'success')
     else:
+        db.session.rollback()
         flash('Cannot cancel this order', 'warning')
     
     return redirect(url_for('orders.list_orders'))
+
+@bp.route('/export.<fmt>')
+@admin_required
+def export(fmt):
+    """Download every order line (admin only)"""
+    return export_response(export_orders, 'orders', fmt)
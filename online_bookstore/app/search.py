@@ -0,0 +1,119 @@
+"""Full-text search over the book catalog
+
+On SQLite the catalog is indexed by an FTS5 virtual table kept in sync with
+the books table by triggers, so every insert, update and delete (from the
+admin views or from raw SQL) is reflected in the index without extra code in
+the routes. Other databases fall back to a LIKE scan.
+"""
+import re
+from collections import namedtuple
+from sqlalchemy import text
+from sqlalchemy.orm import joinedload
+from app.models import db, Book
+
+FTS_TABLE = 'books_fts'
+
+# Column weights for bm25 ranking: title, author, description
+RANK_WEIGHTS = (10.0, 5.0, 1.0)
+
+SearchPage = namedtuple('SearchPage', ['items', 'page', 'per_page', 'has_prev', 'has_next'])
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+_SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, author, description,
+        content='books', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON books BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, author, description)
+        VALUES (new.id, new.title, new.author, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON books BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author, description)
+        VALUES ('delete', old.id, old.title, old.author, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title, author, description ON books BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author, description)
+        VALUES ('delete', old.id, old.title, old.author, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, title, author, description)
+        VALUES (new.id, new.title, new.author, new.description);
+    END""",
+]
+
+def fts_enabled():
+    """Return True when the database supports the FTS5 index"""
+    return db.engine.dialect.name == 'sqlite'
+
+def init_search_index():
+    """Create the FTS5 table and sync triggers, indexing existing books"""
+    if not fts_enabled():
+        return
+    exists = db.session.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {'name': FTS_TABLE}
+    ).first()
+    for statement in _SCHEMA:
+        db.session.execute(text(statement))
+    if not exists:
+        rebuild_search_index()
+    db.session.commit()
+
+def drop_search_triggers():
+    """Stop indexing row by row, e.g. before a bulk load
+
+    Call init_search_index() and rebuild_search_index() afterwards to restore
+    the triggers and index the loaded rows in one pass.
+    """
+    if fts_enabled():
+        for suffix in ('ai', 'ad', 'au'):
+            db.session.execute(text(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}'))
+
+def rebuild_search_index():
+    """Re-index every book from the books table"""
+    if fts_enabled():
+        db.session.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+def build_match_query(query):
+    """Turn free text into an FTS5 MATCH expression with prefix matching"""
+    tokens = _TOKEN_RE.findall(query.lower())
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+def escape_like(value):
+    """Escape LIKE wildcards so value matches literally (with escape='\\')"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def search_books(query, page=1, per_page=12):
+    """Return a page of books matching query, best matches first"""
+    page = max(page, 1)
+    offset = (page - 1) * per_page
+
+    if fts_enabled():
+        match = build_match_query(query)
+        if not match:
+            return SearchPage([], page, per_page, False, False)
+        # Fetch one extra row to know whether a next page exists without a COUNT
+        rows = db.session.execute(
+            text(f"""SELECT rowid FROM {FTS_TABLE}
+                     WHERE {FTS_TABLE} MATCH :match
+                     ORDER BY bm25({FTS_TABLE}, :w_title, :w_author, :w_description)
+                     LIMIT :limit OFFSET :offset"""),
+            {'match': match, 'w_title': RANK_WEIGHTS[0], 'w_author': RANK_WEIGHTS[1],
+             'w_description': RANK_WEIGHTS[2], 'limit': per_page + 1, 'offset': offset}
+        ).scalars().all()
+        ids = rows[:per_page]
+        books_by_id = {}
+        if ids:
+            books = Book.query.options(joinedload(Book.category)).filter(Book.id.in_(ids)).all()
+            books_by_id = {book.id: book for book in books}
+        items = [books_by_id[book_id] for book_id in ids if book_id in books_by_id]
+    else:
+        pattern = f'%{escape_like(query)}%'
+        rows = Book.query.options(joinedload(Book.category)).filter(
+            Book.title.ilike(pattern, escape='\\') | Book.author.ilike(pattern, escape='\\')
+            | Book.description.ilike(pattern, escape='\\')
+        ).order_by(Book.id).offset(offset).limit(per_page + 1).all()
+        items = rows[:per_page]
+
+    return SearchPage(items, page, per_page, page > 1, len(rows) > per_page)
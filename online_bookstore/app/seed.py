@@ -0,0 +1,225 @@
+"""Database seeding: the sample catalog and synthetic benchmark data
+
+Rows are written with Core ``INSERT`` executemany rather than one ORM
+object at a time. Synthetic data is written in chunks, so memory stays
+bounded by ``chunk_size`` and millions of rows load in minutes. Synthetic
+output is deterministic for a given seed, and new rows are appended after
+the current maximum ids, so generation can run on top of the sample data or
+an earlier generated dataset.
+"""
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import insert, func
+from app.passwords import hasher
+from app.models import db, User, Category, Book, Order, OrderItem
+from app.search import drop_search_triggers, init_search_index, rebuild_search_index
+
+# Every generated user shares this password so load tests can log in
+SYNTHETIC_PASSWORD = 'password'
+
+_WORDS = (
+    'silent river shadow empire garden secret winter machine ocean history '
+    'light code stone journey city dream fire island mind star night theory '
+    'kingdom memory science world voyage data network quantum mountain song '
+    'atlas frontier echo harbor legacy origin pattern signal summer truth'
+).split()
+_FIRST_NAMES = 'Ada Alan Grace Linus Mary Ravi Sita Tom Uma Yuki Omar Lena Ivan Nora'.split()
+_LAST_NAMES = 'Hopper Turing Lovelace Knuth Shah Tanaka Novak Okafor Silva Berg Rossi'.split()
+
+SAMPLE_CATEGORIES = ('Fiction', 'Science', 'Technology', 'History', 'Biography')
+
+# (title, author, price, stock, description, category)
+SAMPLE_BOOKS = (
+    # Fiction (10 books)
+    ('The Great Gatsby', 'F. Scott Fitzgerald', 12.99, 50, 'A classic American novel', 'Fiction'),
+    ('1984', 'George Orwell', 14.99, 30, 'Dystopian social science fiction', 'Fiction'),
+    ('To Kill a Mockingbird', 'Harper Lee', 13.99, 45, 'A gripping tale of racial injustice', 'Fiction'),
+    ('Pride and Prejudice', 'Jane Austen', 11.99, 40, 'A romantic novel of manners', 'Fiction'),
+    ('The Catcher in the Rye', 'J.D. Salinger', 12.49, 35, 'A story of teenage rebellion', 'Fiction'),
+    ('Harry Potter and the Sorcerer Stone', 'J.K. Rowling', 19.99, 60, 'A young wizard discovers his magical heritage', 'Fiction'),
+    ('The Hobbit', 'J.R.R. Tolkien', 15.99, 50, 'A fantasy adventure in Middle Earth', 'Fiction'),
+    ('The Lord of the Rings', 'J.R.R. Tolkien', 29.99, 40, 'Epic fantasy trilogy', 'Fiction'),
+    ('Animal Farm', 'George Orwell', 10.99, 55, 'A satirical allegorical novella', 'Fiction'),
+    ('Brave New World', 'Aldous Huxley', 13.49, 38, 'Dystopian novel about a futuristic society', 'Fiction'),
+    # Science (6 books)
+    ('A Brief History of Time', 'Stephen Hawking', 18.99, 25, 'Popular science book on cosmology', 'Science'),
+    ('The Selfish Gene', 'Richard Dawkins', 16.99, 30, 'Gene-centered view of evolution', 'Science'),
+    ('Cosmos', 'Carl Sagan', 17.99, 28, 'Journey through space and time', 'Science'),
+    ('The Origin of Species', 'Charles Darwin', 14.99, 32, 'Foundation of evolutionary biology', 'Science'),
+    ('Astrophysics for People in a Hurry', 'Neil deGrasse Tyson', 15.99, 45, 'Quick guide to the universe', 'Science'),
+    ('The Double Helix', 'James Watson', 13.99, 25, 'Discovery of DNA structure', 'Science'),
+    # Technology (6 books)
+    ('Clean Code', 'Robert C. Martin', 45.99, 40, 'A handbook of agile software craftsmanship', 'Technology'),
+    ('The Pragmatic Programmer', 'Andrew Hunt', 42.99, 35, 'Your journey to mastery', 'Technology'),
+    ('Design Patterns', 'Gang of Four', 49.99, 25, 'Elements of reusable object-oriented software', 'Technology'),
+    ('Introduction to Algorithms', 'Thomas Cormen', 89.99, 20, 'Comprehensive guide to algorithms', 'Technology'),
+    ('Code Complete', 'Steve McConnell', 54.99, 30, 'A practical handbook of software construction', 'Technology'),
+    ('The Mythical Man-Month', 'Frederick Brooks', 38.99, 28, 'Essays on software engineering', 'Technology'),
+    # History (5 books)
+    ('Sapiens', 'Yuval Noah Harari', 22.99, 35, 'A brief history of humankind', 'History'),
+    ('Guns Germs and Steel', 'Jared Diamond', 20.99, 30, 'The fates of human societies', 'History'),
+    ('The History of Ancient World', 'Susan Wise Bauer', 24.99, 20, 'From earliest accounts to the fall of Rome', 'History'),
+    ('A People History of the United States', 'Howard Zinn', 19.99, 35, 'American history from the perspective of common people', 'History'),
+    ('The Silk Roads', 'Peter Frankopan', 21.99, 28, 'A new history of the world', 'History'),
+    # Biography (3 books)
+    ('Steve Jobs', 'Walter Isaacson', 28.99, 20, 'The exclusive biography', 'Biography'),
+    ('Becoming', 'Michelle Obama', 26.99, 40, 'Memoir of former First Lady', 'Biography'),
+    ('Einstein His Life and Universe', 'Walter Isaacson', 27.99, 25, 'Biography of Albert Einstein', 'Biography'),
+)
+
+SAMPLE_USERS = (
+    # (name, email, password, role)
+    ('Admin User', 'admin@bookstore.com', 'admin123', 'admin'),
+    ('John Doe', 'john@example.com', 'customer123', 'customer'),
+)
+
+def seed_sample_data():
+    """Insert the sample users, categories and books unless users already exist
+
+    Returns True if data was inserted.
+    """
+    if db.session.query(User.id).first():
+        return False
+
+    db.session.execute(insert(User.__table__), [
+        {'name': name, 'email': email, 'password_hash': hasher.hash(password),
+          'role': role, 'created_at': datetime.utcnow()}
+        for name, email, password, role in SAMPLE_USERS
+    ])
+    db.session.execute(insert(Category.__table__), [{'name': name} for name in SAMPLE_CATEGORIES])
+    category_ids = dict(db.session.query(Category.name, Category.id))
+    db.session.execute(insert(Book.__table__), [
+        {'title': title, 'author': author, 'price': price, 'stock': stock,
+          'description': description, 'category_id': category_ids[category],
+          'created_at': datetime.utcnow()}
+        for title, author, price, stock, description, category in SAMPLE_BOOKS
+    ])
+    db.session.commit()
+    return True
+
+def _next_id(model):
+    return (db.session.query(func.max(model.id)).scalar() or 0) + 1
+
+def _insert_chunks(table, rows, chunk_size, progress=None, label=''):
+    """Insert an iterable of row dicts in chunks"""
+    chunk = []
+    written = 0
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            db.session.execute(insert(table), chunk)
+            db.session.commit()
+            written += len(chunk)
+            chunk = []
+            if progress:
+                progress(label, written)
+    if chunk:
+        db.session.execute(insert(table), chunk)
+        db.session.commit()
+        written += len(chunk)
+        if progress:
+            progress(label, written)
+    return written
+
+def generate_catalog(books=0, users=0, orders=0, categories=20, seed=42,
+                     chunk_size=10000, progress=None):
+    """Append synthetic categories, books, users and orders to the database
+
+    ``progress(label, rows_written)`` is called after every chunk.
+    Returns a dict with the number of rows written per table.
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    written = {}
+
+    # Categories: top up to the requested total
+    existing = Category.query.count()
+    new_categories = [{'name': f'Category {n}'} for n in range(existing + 1, categories + 1)]
+    if new_categories:
+        db.session.execute(insert(Category.__table__), new_categories)
+        db.session.commit()
+    written['categories'] = len(new_categories)
+    category_ids = [category_id for (category_id,) in db.session.query(Category.id)]
+
+    # Books; row-by-row FTS indexing is replaced by one rebuild at the end
+    first_book = _next_id(Book)
+    drop_search_triggers()
+    db.session.commit()
+
+    def book_rows():
+        for book_id in range(first_book, first_book + books):
+            title = ' '.join(rng.choice(_WORDS) for _ in range(rng.randint(2, 5))).title()
+            yield {
+                'id': book_id,
+                'title': f'{title} {book_id}',
+                'author': f'{rng.choice(_FIRST_NAMES)} {rng.choice(_LAST_NAMES)}',
+                'price': round(rng.uniform(5, 90), 2),
+                'stock': rng.randint(0, 1000),
+                'description': ' '.join(rng.choice(_WORDS) for _ in range(rng.randint(8, 30))),
+                'category_id': rng.choice(category_ids),
+                'created_at': now - timedelta(days=rng.randint(0, 3650)),
+            }
+
+    written['books'] = _insert_chunks(Book.__table__, book_rows(), chunk_size, progress, 'books')
+    init_search_index()
+    rebuild_search_index()
+    db.session.commit()
+
+    # Users share one hash: hashing each password would dominate load time
+    first_user = _next_id(User)
+    password_hash = hasher.hash(SYNTHETIC_PASSWORD)
+
+    def user_rows():
+        for user_id in range(first_user, first_user + users):
+            yield {
+                'id': user_id,
+                'name': f'{rng.choice(_FIRST_NAMES)} {rng.choice(_LAST_NAMES)}',
+                'email': f'user{user_id}@example.com',
+                'password_hash': password_hash,
+                'role': 'customer',
+                'created_at': now - timedelta(days=rng.randint(0, 3650)),
+            }
+
+    written['users'] = _insert_chunks(User.__table__, user_rows(), chunk_size, progress, 'users')
+
+    # Orders with one to three items each, over the last two years
+    max_user = _next_id(User) - 1
+    first_order = _next_id(Order)
+    prices = dict(db.session.query(Book.id, Book.price)) if orders else {}
+    book_ids = list(prices)
+    items = []
+
+    def order_rows():
+        for order_id in range(first_order, first_order + orders):
+            total = 0.0
+            for book_id in set(rng.choice(book_ids) for _ in range(rng.randint(1, 3))):
+                quantity = rng.randint(1, 3)
+                total += prices[book_id] * quantity
+                items.append({'order_id': order_id, 'book_id': book_id,
+                              'quantity': quantity, 'unit_price': prices[book_id]})
+            yield {
+                'id': order_id,
+                'user_id': rng.randint(1, max_user),
+                'status': rng.choices(('pending', 'completed', 'cancelled'), (2, 7, 1))[0],
+                'total_price': round(total, 2),
+                'created_at': now - timedelta(minutes=rng.randint(0, 2 * 365 * 24 * 60)),
+            }
+
+    def drain_items():
+        # Items are produced alongside their orders and flushed with them
+        while items:
+            yield items.pop()
+
+    written['orders'] = 0
+    written['order_items'] = 0
+    if orders and book_ids and max_user:
+        rows = order_rows()
+        while True:
+            chunk = [row for _, row in zip(range(chunk_size), rows)]
+            if not chunk:
+                break
+            written['orders'] += _insert_chunks(Order.__table__, chunk, chunk_size)
+            written['order_items'] += _insert_chunks(OrderItem.__table__, drain_items(), chunk_size)
+            if progress:
+                progress('orders', written['orders'])
+    return written
@@ -0,0 +1,78 @@
+"""Jobs run in the background by app.jobs workers
+
+Order and contact side effects are queued here instead of running inside
+the request, along with catalog imports uploaded by admins and periodic
+maintenance such as recommendations. Emails are written to the
+``bookstore.mail`` logger; replace ``send_email`` to deliver them through a
+real mail service.
+"""
+import logging
+import os
+from contextlib import suppress
+from flask import current_app
+from sqlalchemy.orm import selectinload, joinedload
+from app.jobs import task
+from app.models import db, Order, OrderItem
+from app.analytics import record_order, record_status_change
+from app.recommendations import rebuild_recommendations
+from app.bulk import read_rows, import_books
+
+mail_logger = logging.getLogger('bookstore.mail')
+
+def send_email(to, subject, body):
+    """Send one email"""
+    mail_logger.info('To: %s\nSubject: %s\n\n%s', to, subject, body)
+
+def _load_order(order_id):
+    return db.session.get(Order, order_id, options=[
+        selectinload(Order.items).joinedload(OrderItem.book), joinedload(Order.user)
+    ])
+
+@task('analytics.order_placed')
+def order_placed_analytics(order_id, status):
+    """Add a new order to the sales aggregates"""
+    record_order(_load_order(order_id), status)
+
+@task('analytics.order_cancelled')
+def order_cancelled_analytics(order_id):
+    """Move a cancelled order out of the sales aggregates"""
+    record_status_change(_load_order(order_id), 'pending', 'cancelled')
+
+@task('recommendations.rebuild', max_attempts=2)
+def recommendations_rebuild():
+    """Recompute the co-purchase recommendations"""
+    rebuild_recommendations()
+
+# A failed import is rolled back whole, and retrying a bad file cannot help
+@task('catalog.import', max_attempts=1)
+def catalog_import(path, fmt, dry_run=False):
+    """Import an uploaded catalog file, then delete it; returns the report"""
+    try:
+        with open(path, encoding='utf-8-sig') as stream:
+            report = import_books(read_rows(stream, fmt), dry_run=dry_run)
+    finally:
+        with suppress(FileNotFoundError):
+            os.remove(path)
+    return report._asdict()
+
+@task('mail.order_confirmation')
+def order_confirmation(order_id):
+    """Email the customer a summary of a new order"""
+    order = _load_order(order_id)
+    lines = '\n'.join(f'  {item.quantity} x {item.book.title}  ${item.subtotal:.2f}' for item in order.items)
+    send_email(order.user.email, f'Your order #{order.id}',
+               f'Hi {order.user.name},\n\nThank you for your order:\n\n{lines}\n\n'
+               f'Total: ${order.total_price:.2f}\n')
+
+@task('mail.order_cancelled')
+def order_cancellation(order_id):
+    """Email the customer that an order was cancelled"""
+    order = _load_order(order_id)
+    send_email(order.user.email, f'Order #{order.id} cancelled',
+               f'Hi {order.user.name},\n\nYour order #{order.id} has been cancelled.\n')
+
+@task('mail.contact_message')
+def contact_message(name, email, message):
+    """Forward a contact form message to support"""
+    send_email(current_app.config['SUPPORT_EMAIL'], f'Contact form: {name}',
+               f'From: {name} <{email}>\n\n{message}\n')
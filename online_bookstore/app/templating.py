@@ -0,0 +1,67 @@
+"""Template compilation and fragment caching
+
+Compiled templates are kept in a bytecode cache on disk
+(``TEMPLATE_BYTECODE_CACHE``), so a new worker loads them instead of parsing
+every template again.
+
+``{% cache key, ttl %}...{% endcache %}`` stores the rendered block in the
+application cache under ``key`` (a value or tuple) for ``ttl`` seconds, or
+``FRAGMENT_CACHE_TTL`` when omitted. Keys for book fragments include the
+book's version from ``book_versions``, which changes whenever the book is
+invalidated, so edited books are re-rendered and stale entries simply
+expire.
+
+``render_stream`` sends a page while it renders, for long lists.
+"""
+import os
+from flask import current_app, Response, stream_with_context, get_flashed_messages
+from jinja2 import nodes, FileSystemBytecodeCache
+from jinja2.ext import Extension
+from markupsafe import Markup
+from app.cache import cache
+from app.catalog import book_versions
+
+class FragmentCacheExtension(Extension):
+    """Adds the {% cache key[, ttl] %} ... {% endcache %} tag"""
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        if parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        else:
+            args.append(nodes.Const(None))
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('_cached', args), [], [], body).set_lineno(lineno)
+
+    def _cached(self, key, ttl, caller):
+        if isinstance(key, (tuple, list)):
+            key = ':'.join(str(part) for part in key)
+        key = f'fragment:{key}'
+        html = cache.get(key)
+        if html is None:
+            html = str(caller())
+            cache.set(key, html, ttl or current_app.config['FRAGMENT_CACHE_TTL'])
+        return Markup(html)
+
+def render_stream(template_name, **context):
+    """Stream a rendered template in chunks of TEMPLATE_STREAM_BUFFER pieces"""
+    app = current_app._get_current_object()
+    # Pop flashed messages now: the session cookie is sent before the body
+    get_flashed_messages(with_categories=True)
+    template = app.jinja_env.get_or_select_template(template_name)
+    app.update_template_context(context)
+    stream = template.stream(context)
+    stream.enable_buffering(app.config['TEMPLATE_STREAM_BUFFER'])
+    return Response(stream_with_context(stream), mimetype='text/html')
+
+def init_templating(app):
+    """Enable the bytecode cache and the {% cache %} tag"""
+    if app.config['TEMPLATE_BYTECODE_CACHE']:
+        directory = app.config.get('TEMPLATE_BYTECODE_CACHE_DIR') or os.path.join(app.instance_path, 'jinja-cache')
+        os.makedirs(directory, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.globals['book_versions'] = book_versions
@@ -0,0 +1 @@
+"""Benchmark and load-test tools (run from the online_bookstore directory)"""
@@ -0,0 +1,300 @@
+"""Drive the bookstore under concurrent load and report latency percentiles
+
+Example (from the online_bookstore directory):
+
+    python -m benchmarks.bench --concurrency 8 --requests 2000 --output run.json
+    python -m benchmarks.bench --baseline run.json
+
+By default requests go through Flask test clients in worker threads.
+``--server`` starts a local threaded WSGI server and measures over HTTP,
+and ``--url`` targets an already running server (e.g. gunicorn with several
+workers) that uses the same ``--database``. The ``orders.create`` scenario
+places real orders and decrements stock.
+"""
+import argparse
+import json
+import logging
+import random
+import re
+import sys
+import threading
+import time
+import http.cookiejar
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.common import DEFAULT_DATABASE, make_app
+from app.models import db, User, Book, Category
+from app.seed import SYNTHETIC_PASSWORD
+
+_QUERIES_RE = re.compile(r'desc="(\d+) queries"')
+_METRIC_RE = re.compile(r'^(bookstore_db_queries_total|bookstore_request_duration_seconds_count)'
+                        r'\{endpoint="([^"]+)"\} (\d+)$', re.M)
+
+# Scenario name -> (endpoint, needs login, request builder)
+SCENARIOS = {}
+
+def scenario(name, endpoint, login=False):
+    """Register a request builder returning (method, path, form data)"""
+    def register(f):
+        SCENARIOS[name] = (endpoint, login, f)
+        return f
+    return register
+
+@scenario('list_books', 'books.list_books')
+def _list_books(rng, ctx):
+    if rng.random() < 0.5:
+        return 'GET', f'/books/?category={rng.choice(ctx["categories"])}', None
+    return 'GET', f'/books/?after={rng.randint(0, ctx["max_book"])}', None
+
+@scenario('search', 'main.search')
+def _search(rng, ctx):
+    query = ' '.join(rng.sample(ctx['words'], rng.randint(1, 2)))
+    return 'GET', '/search?' + urllib.parse.urlencode({'q': query}), None
+
+@scenario('detail', 'books.detail')
+def _detail(rng, ctx):
+    return 'GET', f'/books/{rng.randint(1, ctx["max_book"])}', None
+
+@scenario('dashboard', 'main.dashboard', login=True)
+def _dashboard(rng, ctx):
+    return 'GET', '/dashboard', None
+
+@scenario('orders.create', 'orders.create', login=True)
+def _create_order(rng, ctx):
+    return 'POST', f'/orders/create/{rng.randint(1, ctx["max_book"])}', {'quantity': '1'}
+
+class TestClientDriver:
+    """Issue requests through a Flask test client"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        response.close()
+        return response.status_code, response.headers.get('Server-Timing', '')
+
+    def text(self, path):
+        return self.client.get(path).get_data(as_text=True)
+
+class HttpDriver:
+    """Issue requests over HTTP, keeping cookies and not following redirects"""
+
+    class _NoRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *args, **kwargs):
+            return None
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), self._NoRedirect()
+        )
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with self.opener.open(req) as response:
+                response.read()
+                return response.status, response.headers.get('Server-Timing', '')
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers.get('Server-Timing', '')
+
+    def text(self, path):
+        try:
+            with self.opener.open(self.base_url + path) as response:
+                return response.read().decode()
+        except urllib.error.HTTPError:
+            return ''
+
+def load_context(app):
+    """Collect ids and words the scenarios pick from"""
+    with app.app_context():
+        max_book = db.session.query(db.func.max(Book.id)).scalar() or 1
+        categories = [category_id for (category_id,) in db.session.query(Category.id)]
+        titles = [title for (title,) in db.session.query(Book.title).limit(500)]
+        synthetic = db.session.query(db.func.min(User.id), db.func.max(User.id)).filter(
+            User.email.like('user%@example.com')
+        ).one()
+    words = sorted({word.lower() for title in titles for word in title.split() if word.isalpha()})
+    if synthetic[0] is not None:
+        logins = [(f'user{user_id}@example.com', SYNTHETIC_PASSWORD)
+                  for user_id in range(synthetic[0], synthetic[1] + 1)]
+    else:
+        logins = [('john@example.com', 'customer123')]
+    return {'max_book': max_book, 'categories': categories or [1],
+            'words': words or ['the'], 'logins': logins}
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def endpoint_totals(driver, endpoint):
+    """(SQL statements, requests) recorded so far for endpoint by /metrics"""
+    totals = {name: int(value) for name, metric_endpoint, value in _METRIC_RE.findall(driver.text('/metrics'))
+              if metric_endpoint == endpoint}
+    return (totals.get('bookstore_db_queries_total', 0),
+            totals.get('bookstore_request_duration_seconds_count', 0))
+
+def run_scenario(name, make_driver, ctx, requests, concurrency, warmup, seed):
+    """Run one scenario and return its summary statistics"""
+    endpoint, login, build = SCENARIOS[name]
+    # Streamed pages have no Server-Timing header; their query counts come
+    # from the /metrics totals, which are recorded once the body is sent
+    metrics_driver = make_driver()
+    before = endpoint_totals(metrics_driver, endpoint)
+    per_worker = [requests // concurrency + (1 if i < requests % concurrency else 0)
+                  for i in range(concurrency)]
+    lock = threading.Lock()
+    latencies = []
+    queries = []
+    errors = [0]
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        driver = make_driver()
+        if login:
+            email, password = rng.choice(ctx['logins'])
+            driver.request('POST', '/auth/login', {'email': email, 'password': password})
+        for _ in range(warmup):
+            driver.request(*build(rng, ctx))
+        local_latencies, local_queries, local_errors = [], [], 0
+        for _ in range(per_worker[index]):
+            method, path, data = build(rng, ctx)
+            started = time.perf_counter()
+            status, timing = driver.request(method, path, data)
+            local_latencies.append((time.perf_counter() - started) * 1000)
+            match = _QUERIES_RE.search(timing)
+            if match:
+                local_queries.append(int(match.group(1)))
+            if status >= 400:
+                local_errors += 1
+        with lock:
+            latencies.extend(local_latencies)
+            queries.extend(local_queries)
+            errors[0] += local_errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    after = endpoint_totals(metrics_driver, endpoint)
+    if queries:
+        mean_queries = round(sum(queries) / len(queries), 2)
+    elif after[1] > before[1]:
+        mean_queries = round((after[0] - before[0]) / (after[1] - before[1]), 2)
+    else:
+        mean_queries = None
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'mean_queries': mean_queries,
+        'max_queries': max(queries) if queries else None,
+    }
+
+def print_report(results, baseline=None):
+    """Print a results table, with changes against a baseline if given"""
+    header = f'{"scenario":<16}{"reqs":>8}{"err":>6}{"rps":>10}{"p50":>10}{"p95":>10}{"p99":>10}{"queries":>9}'
+    print(header)
+    print('-' * len(header))
+    for name, r in results.items():
+        print(f'{name:<16}{r["requests"]:>8}{r["errors"]:>6}{r["throughput_rps"]:>10}'
+              f'{r["p50_ms"]:>10}{r["p95_ms"]:>10}{r["p99_ms"]:>10}{str(r["mean_queries"]):>9}')
+        if baseline and name in baseline:
+            b = baseline[name]
+            changes = []
+            for key in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms'):
+                if b[key]:
+                    changes.append(f'{key} {(r[key] - b[key]) / b[key] * 100:+.1f}%')
+            if b.get('mean_queries') is not None and r['mean_queries'] is not None:
+                changes.append(f'queries {r["mean_queries"] - b["mean_queries"]:+.2f}')
+            print(f'{"":<16}vs baseline: ' + ', '.join(changes))
+
+def find_regressions(results, baseline, tolerance):
+    """Scenarios whose p95 grew, or query count rose, beyond the baseline"""
+    regressions = []
+    for name, r in results.items():
+        b = baseline.get(name)
+        if not b:
+            continue
+        if b['p95_ms'] and r['p95_ms'] > b['p95_ms'] * (1 + tolerance):
+            regressions.append(f'{name}: p95 {b["p95_ms"]}ms -> {r["p95_ms"]}ms')
+        if b.get('mean_queries') is not None and r['mean_queries'] is not None \
+                and r['mean_queries'] > b['mean_queries'] + 0.5:
+            regressions.append(f'{name}: queries {b["mean_queries"]} -> {r["mean_queries"]}')
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', default=DEFAULT_DATABASE, help='SQLAlchemy database URL')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help='comma separated subset of: ' + ', '.join(SCENARIOS))
+    parser.add_argument('--requests', type=int, default=500, help='measured requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--warmup', type=int, default=5, help='unmeasured requests per worker')
+    parser.add_argument('--seed', type=int, default=1)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--server', action='store_true', help='measure through a local WSGI server')
+    target.add_argument('--url', help='measure an already running server')
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--baseline', help='compare against a previous --output file')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed p95 increase over the baseline before failing (0.2 = 20%%)')
+    args = parser.parse_args(argv)
+
+    app = make_app(args.database)
+    ctx = load_context(app)
+
+    server = None
+    if args.server:
+        from werkzeug.serving import make_server
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f'http://127.0.0.1:{server.server_port}'
+        make_driver = lambda: HttpDriver(base_url)
+    elif args.url:
+        make_driver = lambda: HttpDriver(args.url)
+    else:
+        make_driver = lambda: TestClientDriver(app)
+
+    results = {}
+    try:
+        for name in args.scenarios.split(','):
+            results[name] = run_scenario(name, make_driver, ctx, args.requests,
+                                         args.concurrency, args.warmup, args.seed)
+    finally:
+        if server:
+            server.shutdown()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+    print_report(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'settings': {k: v for k, v in vars(args).items() if k not in ('output', 'baseline')},
+                       'results': results}, f, indent=2)
+
+    if baseline:
+        regressions = find_regressions(results, baseline, args.tolerance)
+        if regressions:
+            print('Regressions:\n  ' + '\n  '.join(regressions))
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
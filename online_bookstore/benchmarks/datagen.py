@@ -0,0 +1,43 @@
+"""Generate a large synthetic dataset for benchmarks
+
+Example (from the online_bookstore directory):
+
+    python -m benchmarks.datagen --books 1000000 --users 100000 --orders 10000000
+"""
+import argparse
+import time
+from benchmarks.common import DEFAULT_DATABASE, make_app
+from app.database import init_db
+from app.seed import seed_sample_data, generate_catalog
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', default=DEFAULT_DATABASE, help='SQLAlchemy database URL')
+    parser.add_argument('--books', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--orders', type=int, default=100000)
+    parser.add_argument('--categories', type=int, default=20)
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    app = make_app(args.database)
+    started = time.perf_counter()
+
+    def progress(label, rows):
+        print(f'  {label}: {rows:,} rows ({time.perf_counter() - started:.1f}s)', flush=True)
+
+    with app.app_context():
+        init_db()
+        seed_sample_data()
+        written = generate_catalog(
+            books=args.books, users=args.users, orders=args.orders,
+            categories=args.categories, seed=args.seed,
+            chunk_size=args.chunk_size, progress=progress
+        )
+    elapsed = time.perf_counter() - started
+    print('Generated ' + ', '.join(f'{count:,} {table}' for table, count in written.items())
+          + f' in {elapsed:.1f}s')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""Measure application startup against STARTUP_BUDGET_MS
+
+Each sample runs in a fresh interpreter, like a newly spawned worker, and
+records both the time to import the app package and the time spent in
+create_app. Example (from the online_bookstore directory):
+
+    python -m benchmarks.startup --samples 10
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from benchmarks.common import DEFAULT_DATABASE
+
+_PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+import app
+from benchmarks.common import make_app
+imported = time.perf_counter()
+app = make_app(sys.argv[1])
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': app.config['STARTUP_MS'],
+    'budget_ms': app.config['STARTUP_BUDGET_MS'],
+}))
+'''
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', default=DEFAULT_DATABASE, help='SQLAlchemy database URL')
+    parser.add_argument('--samples', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    samples = []
+    for _ in range(args.samples):
+        output = subprocess.run([sys.executable, '-c', _PROBE, args.database],
+                                check=True, capture_output=True, text=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+
+    budget = samples[0]['budget_ms']
+    for key in ('import_ms', 'create_app_ms'):
+        values = [sample[key] for sample in samples]
+        print(f'{key:<14} median {statistics.median(values):8.1f}  max {max(values):8.1f}')
+    median = statistics.median(sample['create_app_ms'] for sample in samples)
+    print(f'create_app budget {budget} ms: {"OK" if median <= budget else "OVER BUDGET"}')
+    return 0 if median <= budget else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,166 @@
-"""Application configuration settings"""
+"""Application configuration settings
+
+The active profile is chosen with the ``APP_ENV`` environment variable
+(``development``, ``testing`` or ``production``; default ``development``).
+"""
 import os
 
+def _database_url(default):
+    """Read DATABASE_URL, accepting the legacy postgres:// scheme"""
+    url = os.environ.get('DATABASE_URL') or default
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
 class Config:
     """Base configuration class"""
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///bookstore.db'
+    SQLALCHEMY_DATABASE_URI = _database_url('sqlite:///bookstore.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SEARCH_PER_PAGE = 12
+    BOOKS_PER_PAGE = 12
+    MANAGE_PER_PAGE = 50
+    ORDERS_PER_PAGE = 20
+
+    # JSON API (/api/v1): default and maximum ?limit=, and how long clients
+    # and CDNs may reuse catalog responses before revalidating their ETag
+    API_PER_PAGE = 50
+    API_MAX_PER_PAGE = 200
+    API_CACHE_MAX_AGE = 60
+
+    # Application cache. 'sqlite' (instance/cache.sqlite unless CACHE_OPTIONS
+    # sets a path) is shared by the web workers, the job worker and CLI
+    # commands on one host, so their invalidations reach each other;
+    # 'memory' is per process and only safe with a single process
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND') or 'sqlite'
+    CACHE_OPTIONS = {'max_entries': 10000}
+    CACHE_DEFAULT_TTL = 60
+    # Seconds to cache logged-in users' display fields (name, email); role
+    # and session_version are read on every request. 0 loads the whole user
+    # from the database once per request
+    IDENTITY_CACHE_TTL = 30
+
+    # Templates: compiled bytecode cached on disk (instance/jinja-cache by
+    # default), {% cache %} fragments, and chunking of streamed pages
+    TEMPLATE_BYTECODE_CACHE = True
+    TEMPLATE_BYTECODE_CACHE_DIR = os.environ.get('TEMPLATE_BYTECODE_CACHE_DIR')
+    FRAGMENT_CACHE_TTL = 300
+    TEMPLATE_STREAM_BUFFER = 50
+
+    # Response compression; brotli is used when the package is installed
+    COMPRESSION_ENABLED = True
+    COMPRESSION_LEVEL = 6
+    COMPRESSION_BROTLI_QUALITY = 4
+    COMPRESSION_MIN_SIZE = 500
+    # Streamed bodies are flushed to the client every this many bytes
+    COMPRESSION_STREAM_BUFFER = 16 * 1024
+    COMPRESSION_MIMETYPES = ('text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript',
+                             'application/javascript', 'application/json', 'application/x-ndjson')
+
+    # Performance instrumentation: Server-Timing headers, JSON logs of slow
+    # requests/queries on the bookstore.performance logger, and /metrics
+    INSTRUMENTATION_ENABLED = True
+    SERVER_TIMING_ENABLED = True
+    METRICS_ENABLED = True
+    SLOW_REQUEST_MS = 500
+    SLOW_QUERY_MS = 100
+    QUERY_COUNT_WARNING = 20
+
+    # Create tables and sample data inside create_app; otherwise run
+    # `flask init-db` / `flask seed` once before starting workers
+    AUTO_INIT_DB = False
+    # create_app logs a slow_startup event when it takes longer than this
+    STARTUP_BUDGET_MS = 250
+
+    # SQLite connection settings, applied to every new connection.
+    # WAL lets readers proceed while a checkout is committing.
+    SQLITE_JOURNAL_MODE = 'WAL'
+    SQLITE_SYNCHRONOUS = 'NORMAL'
+    SQLITE_BUSY_TIMEOUT_MS = 5000
+
+    # Password hashing. Existing hashes are upgraded on the next login when
+    # the method or salt length changes. With PASSWORD_HASH_WORKERS > 0 hashing
+    # runs in a process pool; at most PASSWORD_HASH_MAX_CONCURRENCY hashes run
+    # at once and requests waiting longer than PASSWORD_HASH_WAIT_SECONDS get a 503.
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'pbkdf2:sha256:600000'
+    PASSWORD_SALT_LENGTH = 16
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 0))
+    PASSWORD_HASH_MAX_CONCURRENCY = int(os.environ.get('PASSWORD_HASH_MAX_CONCURRENCY', 4))
+    PASSWORD_HASH_WAIT_SECONDS = 5
+
+    # Rate limiting (app.ratelimit): token buckets per endpoint, as
+    # (scope, requests, seconds[, methods]) with scope 'ip', 'user' or
+    # 'endpoint'. Use a shared RATELIMIT_STORAGE with several workers.
+    RATELIMIT_ENABLED = True
+    RATELIMIT_STORAGE = os.environ.get('RATELIMIT_STORAGE') or 'memory'
+    RATELIMIT_STORAGE_OPTIONS = {'max_keys': 100000}
+    RATELIMIT_LIMITS = {
+        'main.search': [('ip', 30, 60), ('endpoint', 50, 1)],
+        'auth.login': [('ip', 10, 60, ('POST',)), ('ip', 50, 3600, ('POST',))],
+        'orders.create': [('user', 10, 60)],
+        'orders.checkout': [('user', 10, 60)],
+    }
+    # Admission control: at most this many requests to the expensive
+    # endpoints run at once per process; the rest wait up to
+    # ADMISSION_WAIT_SECONDS for a slot, then get a 503 with Retry-After.
+    ADMISSION_MAX_CONCURRENCY = int(os.environ.get('ADMISSION_MAX_CONCURRENCY', 8))
+    ADMISSION_WAIT_SECONDS = 2
+    ADMISSION_ENDPOINTS = ('main.search', 'auth.login', 'orders.create', 'orders.checkout')
+
+    # Background jobs (app.jobs). Run `flask worker` next to the web
+    # processes, or set JOBS_WORKER_THREADS to run jobs inside each of them.
+    JOBS_WORKER_THREADS = int(os.environ.get('JOBS_WORKER_THREADS', 0))
+    JOBS_POLL_INTERVAL = 1.0
+    JOBS_RETRY_BASE_SECONDS = 5
+    JOBS_LEASE_SECONDS = 300
+    JOBS_RETENTION_HOURS = 24
+    SUPPORT_EMAIL = os.environ.get('SUPPORT_EMAIL') or 'support@bookstore.example'
+    # Catalog files uploaded on the admin import page wait here for the
+    # catalog.import job (default instance/imports); workers must see it too
+    IMPORT_UPLOAD_DIR = os.environ.get('IMPORT_UPLOAD_DIR')
+    # Periodic jobs queued by the workers: job name -> interval in seconds
+    JOBS_SCHEDULE = {'recommendations.rebuild': 6 * 3600}
+
+    # Recommendations (app.recommendations): partners kept per book, pairs
+    # bought together fewer times are ignored, larger orders are skipped
+    RECOMMENDATIONS_PER_BOOK = 12
+    RECOMMENDATIONS_MIN_SUPPORT = 2
+    RECOMMENDATIONS_MAX_BASKET = 50
+    RECOMMENDATIONS_CACHE_TTL = 600
+
+    # Connection pool settings (ignored for in-memory SQLite)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = True
+
+class DevelopmentConfig(Config):
+    """Local development"""
+    DEBUG = True
+    AUTO_INIT_DB = True
+    JOBS_WORKER_THREADS = 1
+
+class TestingConfig(Config):
+    """Automated tests: private in-memory database, no caching"""
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    CACHE_BACKEND = 'null'
+    RATELIMIT_ENABLED = False
+    # Cheap hashes keep test logins fast; never use outside tests
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
+
+class ProductionConfig(Config):
+    """Production deployment; SECRET_KEY and DATABASE_URL come from the environment"""
+    SECRET_KEY = os.environ.get('SECRET_KEY')
+
+config_by_name = {
+    'development': DevelopmentConfig,
+    'testing': TestingConfig,
+    'production': ProductionConfig,
+}
+
+def get_config(name=None):
+    """Return the config class for name, or for APP_ENV if not given"""
+    name = name or os.environ.get('APP_ENV') or 'development'
+    return config_by_name[name]
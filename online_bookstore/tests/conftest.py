@@ -0,0 +1,62 @@
+"""Shared fixtures: an app on TestingConfig with the sample catalog loaded"""
+import pytest
+from sqlalchemy import update
+from app import create_app
+from app.database import init_db
+from app.seed import seed_sample_data
+from app.models import db, Book, User
+from config import TestingConfig
+
+def _make_app(config_class):
+    app = create_app(config_class)
+    with app.app_context():
+        init_db()
+        seed_sample_data()
+    return app
+
+@pytest.fixture
+def app():
+    """In-memory database, for single-threaded tests"""
+    app = _make_app(TestingConfig)
+    with app.app_context():
+        yield app
+
+@pytest.fixture
+def cached_app():
+    """In-memory database with the memory cache backend
+
+    No app context is pushed, so each test client request gets its own
+    ``g`` and session, as in a real worker.
+    """
+    class CachedTestingConfig(TestingConfig):
+        CACHE_BACKEND = 'memory'
+    return _make_app(CachedTestingConfig)
+
+@pytest.fixture
+def file_app(tmp_path):
+    """SQLite file database, so several threads get their own connections"""
+    class FileTestingConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp_path / "test.db"}'
+    app = _make_app(FileTestingConfig)
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+def set_stock(book_id, stock):
+    """Set a book's stock directly, bypassing the ORM version check"""
+    db.session.execute(update(Book).where(Book.id == book_id).values(stock=stock)
+                       .execution_options(synchronize_session=False))
+    db.session.commit()
+
+def stock_of(book_id):
+    """Current stock as committed in the database"""
+    db.session.expire_all()
+    return db.session.get(Book, book_id).stock
+
+def customer_id():
+    """Id of the sample customer, john@example.com"""
+    return User.query.filter_by(email='john@example.com').one().id
+
+def login(client, email='john@example.com', password='customer123'):
+    """Log client in as one of the sample users"""
+    return client.post('/auth/login', data={'email': email, 'password': password})
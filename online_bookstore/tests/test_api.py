@@ -0,0 +1,49 @@
+"""JSON API: field selection, keyset cursors and ETags (routes.api)"""
+from sqlalchemy import update
+from app.models import db, Book
+from app.checkout import place_order
+from conftest import login, customer_id
+
+def test_fields_selects_top_level_fields(app):
+    response = app.test_client().get('/api/v1/books?fields=id,title&limit=2')
+    assert response.status_code == 200
+    assert [set(item) for item in response.json['items']] == [{'id', 'title'}, {'id', 'title'}]
+    assert 'fields=id,title' in response.json['next']
+
+def test_unknown_fields_are_a_json_400(app):
+    response = app.test_client().get('/api/v1/books?fields=id,password')
+    assert response.status_code == 400
+    assert 'password' in response.json['message']
+
+def test_cursors_walk_the_catalog_both_ways(app):
+    client = app.test_client()
+    first = client.get('/api/v1/books?limit=3').json
+    second = client.get(f'/api/v1/books?limit=3&after={first["next_cursor"]}').json
+    back = client.get(f'/api/v1/books?limit=3&before={second["prev_cursor"]}').json
+    ids = [item['id'] for item in first['items'] + second['items']]
+    assert len(set(ids)) == 6
+    assert [item['id'] for item in back['items']] == [item['id'] for item in first['items']]
+    assert first['prev_cursor'] is None
+
+def test_etag_answers_304_until_the_book_changes(app):
+    client = app.test_client()
+    response = client.get('/api/v1/books/1')
+    etag, weak = response.get_etag()
+    assert etag and not weak
+    assert client.get('/api/v1/books/1', headers={'If-None-Match': f'"{etag}"'}).status_code == 304
+    db.session.execute(update(Book).where(Book.id == 1).values(price=Book.price + 1))
+    db.session.commit()
+    response = client.get('/api/v1/books/1', headers={'If-None-Match': f'"{etag}"'})
+    assert response.status_code == 200
+    assert response.get_etag()[0] != etag
+
+def test_orders_are_private_to_the_logged_in_user(app):
+    client = app.test_client()
+    assert client.get('/api/v1/orders').status_code == 401
+    order = place_order(customer_id(), {1: 1})
+    login(client)
+    response = client.get('/api/v1/orders')
+    assert [item['id'] for item in response.json['items']] == [order.id]
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+    login(client, 'admin@bookstore.com', 'admin123')
+    assert client.get(f'/api/v1/orders/{order.id}').status_code == 404
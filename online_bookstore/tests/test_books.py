@@ -0,0 +1,26 @@
+"""Admin book deletion (books.delete)"""
+from app.checkout import place_order
+from app.models import db, Book
+from conftest import login, customer_id
+
+def _admin(app):
+    client = app.test_client()
+    login(client, 'admin@bookstore.com', 'admin123')
+    return client
+
+def test_unordered_book_is_deleted(app):
+    response = _admin(app).post('/books/delete/1', follow_redirects=True)
+    assert b'Book deleted successfully' in response.data
+    assert db.session.get(Book, 1) is None
+
+def test_ordered_book_cannot_be_deleted(app):
+    place_order(customer_id(), {1: 1})
+    response = _admin(app).post('/books/delete/1', follow_redirects=True)
+    assert response.status_code == 200
+    assert b'appears in orders' in response.data
+    db.session.expire_all()
+    assert db.session.get(Book, 1) is not None
+    # The order page still shows the book
+    client = app.test_client()
+    login(client)
+    assert client.get('/orders/').status_code == 200
@@ -0,0 +1,87 @@
+"""Bulk catalog import (app.bulk, the catalog.import job)"""
+import io
+import json
+import os
+import pytest
+from app.bulk import ImportFormatError, read_rows, import_books
+from app.jobs import Worker
+from app.models import db, Book, Job
+from app.search import search_books
+from conftest import login, set_stock, stock_of
+
+def _rows(*rows):
+    return read_rows(io.StringIO(''.join(json.dumps(row) + '\n' for row in rows)), 'jsonl')
+
+def _book(title, **values):
+    return {'title': title, 'author': 'Ann Author', 'price': 9.5, 'category': 'Fiction', **values}
+
+def test_import_inserts_and_updates(app):
+    report = import_books(_rows(_book('Zephyr Tales', stock=4), {'id': 1, **_book('Renamed')}))
+    assert (report.inserted, report.updated, report.invalid) == (1, 1, 0)
+    assert Book.query.filter_by(title='Zephyr Tales').one().stock == 4
+    assert db.session.get(Book, 1).title == 'Renamed'
+
+def test_import_moves_existing_stock_by_delta_only(app):
+    set_stock(1, 10)
+    import_books(_rows({'id': 1, **_book('A', stock=99, stock_delta=-3)}))
+    assert stock_of(1) == 7
+    import_books(_rows({'id': 1, **_book('A', stock_delta=-50)}))
+    assert stock_of(1) == 0
+
+def test_import_reports_invalid_rows(app):
+    report = import_books(_rows(_book('Fine'), _book('', price=1), _book('Bad', price='x')))
+    assert (report.rows, report.inserted, report.invalid) == (3, 1, 2)
+    assert len(report.errors) == 2
+
+def test_malformed_line_rolls_back_the_whole_import(app):
+    before = Book.query.count()
+    feed = json.dumps(_book('First')) + '\n' + json.dumps(_book('Second')) + '\n{not json\n'
+    with pytest.raises(ImportFormatError, match='line 3'):
+        import_books(read_rows(io.StringIO(feed), 'jsonl'), chunk_size=1)
+    assert Book.query.count() == before
+    assert not Book.query.filter_by(title='First').count()
+
+def test_dry_run_writes_nothing(app):
+    before = Book.query.count()
+    report = import_books(_rows(_book('Dry')), dry_run=True)
+    assert report.inserted == 1
+    assert Book.query.count() == before
+
+def test_imported_books_are_searchable_and_the_index_stays_live(app):
+    import_books(_rows(_book('Quixotic Lighthouse')))
+    assert [book.title for book in search_books('quixotic').items] == ['Quixotic Lighthouse']
+    # Writes after the import are still indexed by the triggers
+    book = Book.query.filter_by(title='Quixotic Lighthouse').one()
+    book.title = 'Zanzibar Lighthouse'
+    db.session.commit()
+    assert not search_books('quixotic').items
+    assert [book.title for book in search_books('zanzibar').items] == ['Zanzibar Lighthouse']
+
+def test_admin_import_runs_as_a_job(app, tmp_path):
+    app.config['IMPORT_UPLOAD_DIR'] = str(tmp_path)
+    client = app.test_client()
+    login(client, 'admin@bookstore.com', 'admin123')
+    feed = io.BytesIO((json.dumps(_book('Queued Book', stock=2)) + '\n').encode())
+    response = client.post('/books/import', data={'file': (feed, 'feed.jsonl')})
+    assert response.status_code == 302
+    assert not Book.query.filter_by(title='Queued Book').count()
+    assert b'queued' in client.get(response.headers['Location']).data
+
+    assert Worker(app).run_pending() == 1
+    job = Job.query.filter_by(name='catalog.import').one()
+    assert job.status == 'done'
+    assert json.loads(job.result)['inserted'] == 1
+    assert Book.query.filter_by(title='Queued Book').one().stock == 2
+    assert os.listdir(tmp_path) == []
+    assert b'New books: 1' in client.get(response.headers['Location']).data
+
+def test_admin_import_of_a_bad_file_fails_without_changes(app, tmp_path):
+    app.config['IMPORT_UPLOAD_DIR'] = str(tmp_path)
+    client = app.test_client()
+    login(client, 'admin@bookstore.com', 'admin123')
+    feed = io.BytesIO(b'title,price\nNo author,1\n')
+    response = client.post('/books/import', data={'file': (feed, 'feed.csv')})
+    Worker(app).run_pending()
+    job = Job.query.filter_by(name='catalog.import').one()
+    assert (job.status, job.attempts) == ('failed', 1)
+    assert b'Nothing was imported' in client.get(response.headers['Location']).data
@@ -0,0 +1,53 @@
+"""Cache backends and cross-process invalidation (app.cache, app.catalog)"""
+import time
+import pytest
+from app import create_app
+from app.cache import SQLiteCache
+from app.catalog import get_book, invalidate_books
+from conftest import _make_app, set_stock
+from config import TestingConfig
+
+@pytest.fixture
+def backend(tmp_path):
+    return SQLiteCache(str(tmp_path / 'cache.sqlite'), max_entries=3, prune_interval=1)
+
+def test_sqlite_cache_round_trip(backend):
+    backend.set('book:1', {'id': 1, 'title': 'Dune'})
+    backend.set('missing', None)
+    assert backend.get('book:1') == {'id': 1, 'title': 'Dune'}
+    assert backend.get_many(['book:1', 'book:2']) == {'book:1': {'id': 1, 'title': 'Dune'}}
+    backend.delete('book:1')
+    assert backend.get('book:1') is None
+
+def test_sqlite_cache_counters_and_expiry(backend):
+    assert backend.incr('generation') == 1
+    assert backend.incr('generation') == 2
+    assert backend.get('generation') == 2
+    backend.set('short', 'value', ttl=0.01)
+    time.sleep(0.02)
+    assert backend.get('short') is None
+
+def test_sqlite_cache_prunes_to_max_entries_keeping_counters(backend):
+    backend.incr('generation')
+    for number in range(6):
+        backend.set(f'key:{number}', number * 10, ttl=60 + number)
+    kept = backend.get_many(['generation'] + [f'key:{number}' for number in range(6)])
+    assert 'generation' in kept
+    assert len(kept) <= 3
+
+def test_invalidation_reaches_other_processes(tmp_path):
+    class SharedConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp_path / "test.db"}'
+        CACHE_BACKEND = 'sqlite'
+        CACHE_OPTIONS = {'path': str(tmp_path / 'cache.sqlite')}
+    # Two apps with their own backends stand in for two worker processes
+    web = _make_app(SharedConfig)
+    worker = create_app(SharedConfig)
+    with web.app_context():
+        set_stock(1, 5)
+        assert get_book(1)['stock'] == 5
+    with worker.app_context():
+        set_stock(1, 2)
+        invalidate_books([1])
+    with web.app_context():
+        assert get_book(1)['stock'] == 2
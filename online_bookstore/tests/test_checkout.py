@@ -0,0 +1,73 @@
+"""Multi-line checkout and order cancellation (app.checkout, orders.cancel)"""
+import threading
+import pytest
+from app.models import db, Order, Job
+from app.checkout import place_order, CheckoutError
+from app.inventory import reserve_many
+from conftest import set_stock, stock_of, customer_id
+
+def _login(client):
+    client.post('/auth/login', data={'email': 'john@example.com', 'password': 'customer123'})
+
+def test_checkout_reserves_every_line(app):
+    set_stock(1, 5)
+    set_stock(2, 5)
+    order = place_order(customer_id(), {1: 2, 2: 3})
+    assert {item.book_id: item.quantity for item in order.items} == {1: 2, 2: 3}
+    assert (stock_of(1), stock_of(2)) == (3, 2)
+
+def test_checkout_is_all_or_nothing(app):
+    set_stock(1, 5)
+    set_stock(2, 1)
+    with pytest.raises(CheckoutError, match='Insufficient stock'):
+        place_order(customer_id(), {1: 2, 2: 3})
+    # The line that fit was rolled back with the one that did not
+    assert (stock_of(1), stock_of(2)) == (5, 1)
+    assert Order.query.count() == 0
+    assert Job.query.count() == 0
+
+def test_reserve_many_reports_any_short_line(app):
+    set_stock(1, 5)
+    set_stock(2, 1)
+    assert not reserve_many({1: 1, 2: 2})
+    db.session.rollback()
+    assert (stock_of(1), stock_of(2)) == (5, 1)
+
+def test_checkout_rejects_missing_books(app):
+    with pytest.raises(CheckoutError, match='no longer available'):
+        place_order(customer_id(), {1: 1, 9999: 1})
+    assert Order.query.count() == 0
+
+def test_double_cancel_restores_stock_once(app):
+    set_stock(1, 5)
+    order_id = place_order(customer_id(), {1: 2}).id
+    client = app.test_client()
+    _login(client)
+    client.post(f'/orders/cancel/{order_id}')
+    client.post(f'/orders/cancel/{order_id}')
+    assert stock_of(1) == 5
+    assert db.session.get(Order, order_id).status == 'cancelled'
+    assert Job.query.filter_by(name='analytics.order_cancelled').count() == 1
+
+def test_concurrent_cancels_restore_stock_once(file_app):
+    with file_app.app_context():
+        set_stock(1, 5)
+        order_id = place_order(customer_id(), {1: 2}).id
+    clients = [file_app.test_client() for _ in range(4)]
+    for client in clients:
+        _login(client)
+    start = threading.Barrier(len(clients))
+
+    def cancel(client):
+        start.wait()
+        client.post(f'/orders/cancel/{order_id}')
+
+    threads = [threading.Thread(target=cancel, args=(client,)) for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with file_app.app_context():
+        assert stock_of(1) == 5
+        assert Job.query.filter_by(name='analytics.order_cancelled').count() == 1
@@ -0,0 +1,29 @@
+"""Response compression (app.compression)"""
+import gzip
+from app.compression import _gzip_stream
+
+GZIP = {'Accept-Encoding': 'gzip'}
+
+def test_compressed_api_responses_keep_a_strong_etag(app):
+    client = app.test_client()
+    plain = client.get('/api/v1/books')
+    compressed = client.get('/api/v1/books', headers=GZIP)
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.data) == plain.data
+    etag, weak = compressed.get_etag()
+    assert not weak
+    assert etag != plain.get_etag()[0]
+
+def test_compressed_etag_revalidates(app):
+    client = app.test_client()
+    etag = client.get('/api/v1/books', headers=GZIP).headers['ETag']
+    response = client.get('/api/v1/books', headers={**GZIP, 'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+def test_streams_flush_the_first_chunk_then_in_buffers():
+    rows = [f'{number},A title,An author,9.99\n' for number in range(2000)]
+    pieces = list(_gzip_stream(iter(rows), 6, 16 * 1024))
+    assert gzip.decompress(b''.join(pieces)).decode() == ''.join(rows)
+    # About 70KB of rows: the first row, four full buffers and the trailer
+    assert len(pieces) <= 8
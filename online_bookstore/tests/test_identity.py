@@ -0,0 +1,29 @@
+"""Per-request user loading and the identity cache (app.identity)"""
+from sqlalchemy import update
+from app.models import db, User
+from conftest import login
+
+def _set_user(app, email, **values):
+    """Change a user behind the app's back, as another worker would"""
+    with app.app_context():
+        db.session.execute(update(User).where(User.email == email).values(**values))
+        db.session.commit()
+
+def test_role_change_applies_on_next_request(cached_app):
+    client = cached_app.test_client()
+    login(client, 'admin@bookstore.com', 'admin123')
+    assert client.get('/books/manage').status_code == 200
+    # The first request cached the identity; the demotion must still count
+    _set_user(cached_app, 'admin@bookstore.com', role='customer')
+    response = client.get('/books/manage')
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/')
+
+def test_bumped_session_version_ends_the_session(cached_app):
+    client = cached_app.test_client()
+    login(client)
+    assert client.get('/orders/').status_code == 200
+    _set_user(cached_app, 'john@example.com', session_version=User.session_version + 1)
+    response = client.get('/orders/')
+    assert response.status_code == 302
+    assert '/auth/login' in response.headers['Location']
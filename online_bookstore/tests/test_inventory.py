@@ -0,0 +1,48 @@
+"""Conditional-UPDATE stock reservation (app.inventory)"""
+import threading
+from app.models import db
+from app.inventory import reserve_stock, release_stock
+from conftest import set_stock, stock_of
+
+def test_reserve_takes_stock_while_enough_is_left(app):
+    set_stock(1, 3)
+    assert reserve_stock(1, 2)
+    db.session.commit()
+    assert stock_of(1) == 1
+
+def test_reserve_refuses_to_oversell(app):
+    set_stock(1, 2)
+    assert not reserve_stock(1, 3)
+    db.session.rollback()
+    assert stock_of(1) == 2
+
+def test_release_returns_stock(app):
+    set_stock(1, 2)
+    release_stock(1, 5)
+    db.session.commit()
+    assert stock_of(1) == 7
+
+def test_concurrent_reservations_never_oversell(file_app):
+    with file_app.app_context():
+        set_stock(1, 5)
+    results = []
+    lock = threading.Lock()
+    start = threading.Barrier(12)
+
+    def buy():
+        with file_app.app_context():
+            start.wait()
+            reserved = reserve_stock(1, 1)
+            db.session.commit()
+            with lock:
+                results.append(reserved)
+
+    threads = [threading.Thread(target=buy) for _ in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == 5
+    with file_app.app_context():
+        assert stock_of(1) == 0
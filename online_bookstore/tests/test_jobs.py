@@ -0,0 +1,83 @@
+"""Background job queue: claims, retries, leases (app.jobs)"""
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from app.jobs import task, enqueue, claim, run_job, requeue_expired
+from app.models import db, Book, Job
+from conftest import set_stock, stock_of
+
+calls = []
+
+@task('test.record', max_attempts=2)
+def record(value):
+    calls.append(value)
+    return {'seen': value}
+
+@task('test.fail', max_attempts=2)
+def fail():
+    raise RuntimeError('boom')
+
+@task('test.lose_lease')
+def lose_lease():
+    # Another worker takes the job over (after requeue_expired) before this
+    # one has written anything, then this one sells the remaining stock
+    with db.engine.begin() as connection:
+        connection.execute(update(Job).where(Job.name == 'test.lose_lease')
+                           .values(locked_by='other-worker', attempts=Job.attempts + 1))
+    db.session.execute(update(Book).where(Book.id == 1).values(stock=0))
+
+def _queue(name, payload=None, **values):
+    job_id = enqueue(name, payload)
+    if values:
+        db.session.execute(update(Job).where(Job.id == job_id).values(**values))
+    db.session.commit()
+    return job_id
+
+def test_job_runs_once_and_keeps_its_result(app):
+    calls.clear()
+    job_id = _queue('test.record', {'value': 7})
+    job = claim('worker-1')
+    assert job.id == job_id
+    assert claim('worker-2') is None
+    assert run_job(job)
+    job = db.session.get(Job, job_id)
+    assert (job.status, json.loads(job.result), calls) == ('done', {'seen': 7}, [7])
+
+def test_idempotency_key_queues_one_job(app):
+    assert enqueue('test.record', {'value': 1}, key='once') is not None
+    assert enqueue('test.record', {'value': 1}, key='once') is None
+    db.session.commit()
+    assert Job.query.filter_by(idempotency_key='once').count() == 1
+
+def test_failures_back_off_then_fail(app):
+    job_id = _queue('test.fail')
+    assert not run_job(claim('worker-1'), retry_base_seconds=60)
+    job = db.session.get(Job, job_id)
+    assert (job.status, job.attempts, job.locked_by) == ('queued', 1, None)
+    assert job.run_at > datetime.utcnow() + timedelta(seconds=50)
+    assert 'RuntimeError: boom' in job.last_error
+    # Not due yet
+    assert claim('worker-1') is None
+    db.session.execute(update(Job).where(Job.id == job_id).values(run_at=datetime.utcnow()))
+    db.session.commit()
+    assert not run_job(claim('worker-1'))
+    assert db.session.get(Job, job_id).status == 'failed'
+
+def test_expired_leases_are_requeued(app):
+    stale = _queue('test.record', {'value': 1}, status='running', locked_by='dead',
+                   locked_at=datetime.utcnow() - timedelta(seconds=600))
+    fresh = _queue('test.record', {'value': 2}, status='running', locked_by='alive',
+                   locked_at=datetime.utcnow())
+    assert requeue_expired(300) == 1
+    assert db.session.get(Job, stale).status == 'queued'
+    assert db.session.get(Job, fresh).status == 'running'
+
+def test_a_job_that_lost_its_lease_discards_its_writes(file_app):
+    with file_app.app_context():
+        set_stock(1, 5)
+        job_id = _queue('test.lose_lease')
+        assert not run_job(claim('worker-1'))
+        assert stock_of(1) == 5
+        job = db.session.get(Job, job_id)
+        # The new owner's claim is untouched
+        assert (job.status, job.locked_by, job.attempts) == ('running', 'other-worker', 2)
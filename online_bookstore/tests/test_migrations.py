@@ -0,0 +1,13 @@
+"""Schema upgrades of existing databases (app.migrations)"""
+from sqlalchemy import inspect, text
+from app.database import init_db
+from app.migrations import MIGRATIONS
+from app.models import db
+
+def test_init_db_adds_indexes_missing_from_an_up_to_date_database(app):
+    db.session.execute(text('DROP INDEX ix_orders_user_id_id'))
+    db.session.commit()
+    init_db()
+    indexes = {index['name'] for index in inspect(db.engine).get_indexes('orders')}
+    assert 'ix_orders_user_id_id' in indexes
+    assert db.session.execute(text('PRAGMA user_version')).scalar() == len(MIGRATIONS)
@@ -0,0 +1,46 @@
+"""Optimistic locking of admin book edits (books.edit, Book.version)"""
+from sqlalchemy import update
+from app.models import db, Book
+from conftest import login, set_stock, stock_of
+
+def _form(book, **values):
+    return {'title': book.title, 'author': book.author, 'price': book.price,
+            'description': book.description or '', 'category_id': book.category_id,
+            'version': book.version, 'stock_delta': 0, **values}
+
+def _admin(app):
+    client = app.test_client()
+    login(client, 'admin@bookstore.com', 'admin123')
+    return client
+
+def test_edit_at_current_version_saves_and_bumps_it(app):
+    set_stock(1, 10)
+    book = db.session.get(Book, 1)
+    version = book.version
+    response = _admin(app).post('/books/edit/1', data=_form(book, title='New title', stock_delta=-4))
+    assert response.status_code == 302
+    db.session.expire_all()
+    book = db.session.get(Book, 1)
+    assert (book.title, book.stock, book.version) == ('New title', 6, version + 1)
+
+def test_edit_of_a_changed_book_is_refused_with_409(app):
+    book = db.session.get(Book, 1)
+    stale = _form(book, title='Lost update')
+    # Someone else saves first
+    db.session.execute(update(Book).where(Book.id == 1).values(title='Their title', version=Book.version + 1))
+    db.session.commit()
+    response = _admin(app).post('/books/edit/1', data=stale)
+    assert response.status_code == 409
+    assert b'changed by someone else' in response.data
+    assert b'Lost update' in response.data
+    db.session.expire_all()
+    assert db.session.get(Book, 1).title == 'Their title'
+
+def test_stock_delta_keeps_concurrent_sales(app):
+    set_stock(1, 10)
+    book = db.session.get(Book, 1)
+    form = _form(book, stock_delta=5)
+    # Three copies sell while the form is open; stock changes skip the version
+    set_stock(1, 7)
+    assert _admin(app).post('/books/edit/1', data=form).status_code == 302
+    assert stock_of(1) == 12
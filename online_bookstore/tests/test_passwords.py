@@ -0,0 +1,48 @@
+"""Configurable password hashing and upgrade on login (app.passwords, auth.login)"""
+import pytest
+from werkzeug.security import generate_password_hash
+from app.models import db, User
+from app.passwords import hasher, HashingBusy
+from conftest import login
+
+def _customer():
+    db.session.expire_all()
+    return User.query.filter_by(email='john@example.com').one()
+
+@pytest.mark.parametrize('method', ['pbkdf2', 'pbkdf2:sha256', 'scrypt', 'pbkdf2:sha512:1000'])
+def test_needs_rehash_knows_werkzeug_defaults(app, monkeypatch, method):
+    monkeypatch.setattr(hasher, 'method', method)
+    monkeypatch.setattr(hasher, '_method_prefix', None)
+    assert not hasher.needs_rehash(generate_password_hash('secret', method, hasher.salt_length))
+    assert hasher.needs_rehash(generate_password_hash('secret', 'pbkdf2:sha256:999', hasher.salt_length))
+    assert hasher.needs_rehash(generate_password_hash('secret', method, hasher.salt_length + 2))
+
+def test_login_upgrades_an_outdated_hash(app):
+    user = _customer()
+    user.password_hash = generate_password_hash('customer123', 'pbkdf2:sha256:500')
+    db.session.commit()
+    response = login(app.test_client())
+    assert response.headers['Location'].endswith('/dashboard')
+    user = _customer()
+    assert user.password_hash.startswith(f'{hasher.method}$')
+    assert user.check_password('customer123')
+
+def test_busy_hasher_skips_the_upgrade_but_not_the_login(app, monkeypatch):
+    user = _customer()
+    old_hash = user.password_hash = generate_password_hash('customer123', 'pbkdf2:sha256:500')
+    db.session.commit()
+
+    def busy(password):
+        raise HashingBusy()
+    monkeypatch.setattr(hasher, 'hash', busy)
+    response = login(app.test_client())
+    assert response.headers['Location'].endswith('/dashboard')
+    assert _customer().password_hash == old_hash
+
+def test_busy_hasher_answers_login_with_503(app, monkeypatch):
+    def busy(pwhash, password):
+        raise HashingBusy()
+    monkeypatch.setattr(hasher, 'verify', busy)
+    response = login(app.test_client())
+    assert response.status_code == 503
+    assert 'Retry-After' in response.headers
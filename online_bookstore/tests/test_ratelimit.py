@@ -0,0 +1,60 @@
+"""Rate limits and admission control (app.ratelimit)"""
+import pytest
+from app.ratelimit import limiter
+from conftest import _make_app
+from config import TestingConfig
+
+class LimitedConfig(TestingConfig):
+    RATELIMIT_ENABLED = True
+    RATELIMIT_LIMITS = {
+        'main.search': [('ip', 2, 60), ('endpoint', 4, 60)],
+        'api.books': [('ip', 1, 60)],
+    }
+    ADMISSION_MAX_CONCURRENCY = 1
+    ADMISSION_WAIT_SECONDS = 0.01
+    ADMISSION_ENDPOINTS = ('main.index',)
+
+@pytest.fixture
+def limited_app():
+    return _make_app(LimitedConfig)
+
+def _get(client, url, ip):
+    response = client.get(url, environ_base={'REMOTE_ADDR': ip})
+    response.close()
+    return response
+
+def test_over_the_limit_gets_429_with_retry_after(limited_app):
+    client = limited_app.test_client()
+    assert [_get(client, '/search?q=a', '10.0.0.1').status_code for _ in range(3)] == [200, 200, 429]
+    response = _get(client, '/search?q=a', '10.0.0.1')
+    assert response.status_code == 429
+    assert 1 <= int(response.headers['Retry-After']) <= 30
+    # Another address has its own bucket
+    assert _get(client, '/search?q=a', '10.0.0.2').status_code == 200
+
+def test_a_refused_client_does_not_drain_the_shared_bucket(limited_app):
+    client = limited_app.test_client()
+    for _ in range(10):
+        _get(client, '/search?q=a', '10.0.0.1')
+    # Only the first client's two admitted requests used the endpoint's four tokens
+    assert [_get(client, '/search?q=a', '10.0.0.2').status_code for _ in range(2)] == [200, 200]
+
+def test_api_429_is_json_and_keeps_retry_after(limited_app):
+    client = limited_app.test_client()
+    assert _get(client, '/api/v1/books', '10.0.0.1').status_code == 200
+    response = _get(client, '/api/v1/books', '10.0.0.1')
+    assert response.status_code == 429
+    assert response.is_json and response.json['error'] == 'Too Many Requests'
+    assert 'Retry-After' in response.headers
+
+def test_admission_control_turns_away_requests_without_a_slot(limited_app):
+    client = limited_app.test_client()
+    assert limiter._slots.acquire(timeout=1)
+    try:
+        response = _get(client, '/', '10.0.0.1')
+        assert response.status_code == 503
+        assert 'Retry-After' in response.headers
+    finally:
+        limiter._slots.release()
+    # The slot is released after each request, so these all get in
+    assert [_get(client, '/', '10.0.0.1').status_code for _ in range(3)] == [200, 200, 200]
@@ -0,0 +1,68 @@
+"""Catalog search (app.search)"""
+import pytest
+from sqlalchemy import update
+from app import search
+from app.models import db, Book
+from app.search import search_books
+
+def _retitle(book_id, title):
+    db.session.execute(update(Book).where(Book.id == book_id).values(title=title))
+    db.session.commit()
+
+@pytest.fixture
+def like_search(app, monkeypatch):
+    """Use the LIKE fallback of databases without FTS5"""
+    monkeypatch.setattr(search, 'fts_enabled', lambda: False)
+
+@pytest.mark.parametrize('query', ['%', '50%', '_', 'a_b', 'back\\slash'])
+def test_like_fallback_matches_wildcards_literally(like_search, query):
+    assert search_books(query).items == []
+    _retitle(1, f'Prefix {query} suffix')
+    assert [book.id for book in search_books(query).items] == [1]
+
+def test_like_fallback_is_case_insensitive(like_search):
+    _retitle(1, 'Quixotic Lighthouse')
+    assert [book.id for book in search_books('quixotic LIGHT').items] == [1]
+
+def _add_book(title, author='Ann Author', description=None):
+    book = Book(title=title, author=author, description=description, price=5, stock=1, category_id=1)
+    db.session.add(book)
+    db.session.commit()
+    return book.id
+
+def test_fts_ranks_title_over_author_over_description(app):
+    in_description = _add_book('Plain', description='a zyzzyva appears')
+    in_author = _add_book('Plainer', author='Zyzzyva Jones')
+    in_title = _add_book('Zyzzyva Rising')
+    assert [book.id for book in search_books('zyzzyva').items] == [in_title, in_author, in_description]
+
+def test_fts_matches_word_prefixes_and_all_words(app):
+    both = _add_book('Quantum Garden Walks')
+    _add_book('Quantum Machines')
+    assert [book.id for book in search_books('quant gard').items] == [both]
+
+def test_fts_index_follows_inserts_updates_and_deletes(app):
+    book_id = _add_book('Xylophone Dreams')
+    assert [book.id for book in search_books('xylophone').items] == [book_id]
+    _retitle(book_id, 'Marimba Dreams')
+    assert search_books('xylophone').items == []
+    assert [book.id for book in search_books('marimba').items] == [book_id]
+    db.session.delete(db.session.get(Book, book_id))
+    db.session.commit()
+    assert search_books('marimba').items == []
+
+def test_fts_pages_without_counting(app):
+    ids = [_add_book(f'Vortex volume {number}') for number in range(5)]
+    first = search_books('vortex', page=1, per_page=3)
+    second = search_books('vortex', page=2, per_page=3)
+    assert (first.has_prev, first.has_next, second.has_prev, second.has_next) == (False, True, True, False)
+    assert sorted(book.id for book in first.items + second.items) == ids
+
+def test_queries_without_words_find_nothing(app):
+    assert search_books('"*() -').items == []
+
+def test_search_page(app):
+    _add_book('Nebula Atlas')
+    response = app.test_client().get('/search?q=nebula')
+    assert response.status_code == 200
+    assert b'Nebula Atlas' in response.data